@@ -0,0 +1,203 @@
+"""
+Analytics module: interaction rollups that don't grow with the number of users.
+
+Unique users per day are counted with HyperLogLog sketches (4 KB each,
+about 1.6% error), so DAU/WAU/MAU come from merging at most 30 sketches.
+Command and callback hits are counted per hour and per route.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from math import log
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_FILE = os.getenv("ANALYTICS_FILE", "analytics.json")
+# Seconds between background saves of the rollups
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "60"))
+# Hourly route counters kept
+ANALYTICS_KEEP_HOURS = int(os.getenv("ANALYTICS_KEEP_HOURS", str(7 * 24)))
+# Distinct routes counted per hour; the rest are counted as OTHER_ROUTE
+ANALYTICS_MAX_ROUTES = int(os.getenv("ANALYTICS_MAX_ROUTES", "200"))
+
+# Daily sketches kept (enough for MAU)
+KEEP_DAYS = 30
+OTHER_ROUTE = "other"
+
+# HyperLogLog with 2^12 registers
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+class HyperLogLog:
+    """Approximate count of distinct user IDs."""
+
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers = bytearray(registers) if registers else bytearray(REGISTERS)
+
+    def add(self, user_id: int) -> None:
+        h = int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - PRECISION)
+        rest = h & ((1 << (64 - PRECISION)) - 1)
+        rank = (64 - PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        estimate = ALPHA * REGISTERS * REGISTERS / sum(2.0 ** -r for r in self.registers)
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * REGISTERS and empty:
+            # Small range correction (linear counting)
+            estimate = REGISTERS * log(REGISTERS / empty)
+        return round(estimate)
+
+
+def _day_key(now: datetime) -> str:
+    return now.date().isoformat()
+
+
+def _hour_key(now: datetime) -> str:
+    return now.strftime("%Y-%m-%dT%H")
+
+
+class Analytics:
+    """Daily unique-user sketches and hourly hits per route."""
+
+    def __init__(self, path: str = ANALYTICS_FILE):
+        self.path = path
+        self.days: Dict[str, HyperLogLog] = {}
+        self.hours: Dict[str, Counter] = {}
+        self._dirty = False
+
+    def load(self) -> None:
+        """Load saved rollups, starting empty if the file is missing or unreadable."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.days = {day: HyperLogLog(base64.b64decode(registers)) for day, registers in data["days"].items()}
+            self.hours = {hour: Counter(routes) for hour, routes in data["hours"].items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            logger.warning(f"Could not read {self.path}, starting analytics empty: {e}")
+
+    def record(self, user_id: Optional[int], route: Optional[str], now: Optional[datetime] = None) -> None:
+        """Count one interaction."""
+        now = now or datetime.now()
+        if user_id is not None:
+            day = _day_key(now)
+            sketch = self.days.get(day)
+            if sketch is None:
+                sketch = self.days[day] = HyperLogLog()
+                self._prune(now)
+            sketch.add(user_id)
+        if route is not None:
+            hour = _hour_key(now)
+            routes = self.hours.get(hour)
+            if routes is None:
+                routes = self.hours[hour] = Counter()
+                self._prune(now)
+            if route not in routes and len(routes) >= ANALYTICS_MAX_ROUTES:
+                route = OTHER_ROUTE
+            routes[route] += 1
+        self._dirty = True
+
+    def _prune(self, now: datetime) -> None:
+        oldest_day = _day_key(now - timedelta(days=KEEP_DAYS - 1))
+        oldest_hour = _hour_key(now - timedelta(hours=ANALYTICS_KEEP_HOURS - 1))
+        self.days = {day: sketch for day, sketch in self.days.items() if day >= oldest_day}
+        self.hours = {hour: routes for hour, routes in self.hours.items() if hour >= oldest_hour}
+
+    def active_users(self, days: int, now: Optional[datetime] = None) -> int:
+        """Estimate unique users over the last number of days, today included."""
+        now = now or datetime.now()
+        merged = HyperLogLog()
+        for offset in range(days):
+            sketch = self.days.get(_day_key(now - timedelta(days=offset)))
+            if sketch is not None:
+                merged.merge(sketch)
+        return merged.count()
+
+    def top_routes(self, hours: int = 24, limit: int = 10, now: Optional[datetime] = None) -> List[Tuple[str, int]]:
+        """Get the most used routes over the last number of hours."""
+        now = now or datetime.now()
+        totals = Counter()
+        for offset in range(hours):
+            routes = self.hours.get(_hour_key(now - timedelta(hours=offset)))
+            if routes:
+                totals.update(routes)
+        return totals.most_common(limit)
+
+    def hourly_hits(self, hours: int = 24, now: Optional[datetime] = None) -> List[Tuple[str, int]]:
+        """Get total hits per hour, oldest first."""
+        now = now or datetime.now()
+        result = []
+        for offset in reversed(range(hours)):
+            hour = _hour_key(now - timedelta(hours=offset))
+            routes = self.hours.get(hour)
+            result.append((hour, sum(routes.values()) if routes else 0))
+        return result
+
+    def dump(self) -> Optional[str]:
+        """Serialize the rollups if anything was recorded since the last dump."""
+        if not self._dirty:
+            return None
+        self._dirty = False
+        return json.dumps({
+            "days": {day: base64.b64encode(bytes(sketch.registers)).decode("ascii")
+                     for day, sketch in self.days.items()},
+            "hours": {hour: dict(routes) for hour, routes in self.hours.items()}
+        })
+
+    def write(self, data: str) -> None:
+        """Write dumped rollups to the file."""
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            self._dirty = True
+            raise
+
+    def save(self) -> None:
+        """Write the rollups now if they changed."""
+        data = self.dump()
+        if data is not None:
+            self.write(data)
+
+
+_analytics: Optional[Analytics] = None
+
+
+def get_analytics() -> Analytics:
+    """Get the process-wide analytics, loading saved rollups on first use."""
+    global _analytics
+    if _analytics is None:
+        _analytics = Analytics()
+        _analytics.load()
+    return _analytics
+
+
+async def run_analytics_flush(interval: float = ANALYTICS_FLUSH_INTERVAL) -> None:
+    """Save the rollups every interval."""
+    analytics = get_analytics()
+    while True:
+        await asyncio.sleep(interval)
+        data = analytics.dump()  # on the loop, where records are added
+        if data is None:
+            continue
+        try:
+            await asyncio.to_thread(analytics.write, data)
+        except Exception as e:
+            logger.error(f"Error saving analytics: {e}")
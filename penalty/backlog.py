@@ -0,0 +1,104 @@
+"""
+Backlog module: drain the updates that queued up while the bot was down.
+
+At startup the pending updates are fetched in bulk before polling
+begins. Callback queries are coalesced so only the latest tap per
+message is handled: a user who clicked through five menus while the
+bot was down gets the final menu, not five edits. Everything else is
+kept in order.
+"""
+import logging
+import os
+from time import perf_counter
+from typing import List, Tuple
+
+from telegram import Update
+from telegram.error import TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Drain and coalesce the backlog at startup (0 to handle every update as it comes)
+BACKLOG_DRAIN = os.getenv("BACKLOG_DRAIN", "1") == "1"
+# Most updates drained at startup; the rest are left to regular polling
+BACKLOG_MAX_UPDATES = int(os.getenv("BACKLOG_MAX_UPDATES", "10000"))
+
+# getUpdates returns at most 100 updates per call
+BATCH_SIZE = 100
+
+
+class BacklogDrained:
+    """Queued after the drained updates; handling it means the bot has caught up."""
+
+    def __init__(self, started: float, handled: int, superseded: int):
+        self.started = started
+        self.handled = handled
+        self.superseded = superseded
+
+
+def _callback_key(update: Update):
+    """Get the message a callback query belongs to, or None for other updates."""
+    query = update.callback_query
+    if query is None:
+        return None
+    if query.inline_message_id:
+        return ("inline", query.inline_message_id)
+    if query.message is not None:
+        return (query.message.chat.id, query.message.message_id)
+    return None
+
+
+def coalesce_callbacks(updates: List[Update]) -> Tuple[List[Update], List[Update]]:
+    """Keep only the latest callback query per message.
+
+    Returns (updates to handle in their original order, superseded callback updates).
+    """
+    latest = {}
+    for update in updates:
+        key = _callback_key(update)
+        if key is not None:
+            latest[key] = update.update_id
+    kept = []
+    superseded = []
+    for update in updates:
+        key = _callback_key(update)
+        if key is None or latest[key] == update.update_id:
+            kept.append(update)
+        else:
+            superseded.append(update)
+    return kept, superseded
+
+
+async def fetch_backlog(bot, max_updates: int = BACKLOG_MAX_UPDATES) -> List[Update]:
+    """Fetch pending updates and confirm them, so polling starts after them."""
+    updates = []
+    offset = None
+    while len(updates) < max_updates:
+        batch = await bot.get_updates(
+            offset=offset,
+            limit=min(BATCH_SIZE, max_updates - len(updates)),
+            timeout=0,
+            allowed_updates=Update.ALL_TYPES
+        )
+        if not batch:
+            break
+        updates.extend(batch)
+        offset = batch[-1].update_id + 1
+    else:
+        if offset is not None:
+            # Hit the limit: confirm the last batch, getUpdates only forgets updates below the offset
+            await bot.get_updates(offset=offset, limit=1, timeout=0, allowed_updates=Update.ALL_TYPES)
+    return updates
+
+
+async def drain_backlog(bot) -> Tuple[List[Update], List[Update], float]:
+    """Fetch and coalesce the backlog. Returns (updates to handle, superseded callbacks, start time)."""
+    started = perf_counter()
+    try:
+        updates = await fetch_backlog(bot)
+    except TelegramError as e:
+        logger.warning(f"Could not drain the update backlog, polling will handle it: {e}")
+        return [], [], started
+    kept, superseded = coalesce_callbacks(updates)
+    if updates:
+        logger.info(f"Drained {len(updates)} pending updates, {len(superseded)} superseded callbacks dropped")
+    return kept, superseded, started
@@ -0,0 +1,111 @@
+"""
+Backup module: scheduled point-in-time copies of all users.
+
+The store and the cold archive are captured together on the event loop
+(copy-on-write: only records changed since loading are copied), then
+written and compressed in a worker thread, so handlers never wait for a
+backup. Each backup is a compressed users_data.json with the archived
+users included; restoring one is decompressing it over users_data.json.
+The newest BACKUP_KEEP backups are kept.
+"""
+import asyncio
+import gzip
+import logging
+import lzma
+import os
+import re
+from datetime import datetime
+from time import perf_counter, time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from user_tracker import capture_all_users, dump_users_json
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+# Seconds between scheduled backups (0 = only on /backup)
+BACKUP_INTERVAL = float(os.getenv("BACKUP_INTERVAL", str(6 * 3600)))
+# Backups kept; older ones are deleted
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+# gzip (faster) or lzma (smaller)
+BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "gzip")
+
+# compression -> (file extension, opener)
+COMPRESSORS = {
+    "gzip": (".json.gz", lambda path: gzip.open(path, "wt", encoding="utf-8", compresslevel=6)),
+    "lzma": (".json.xz", lambda path: lzma.open(path, "wt", encoding="utf-8"))
+}
+
+BACKUP_NAME = re.compile(r"^users-\d{8}-\d{6}\.json\.(gz|xz)$")
+
+_running = False
+
+
+def list_backups(directory: str = BACKUP_DIR) -> List[str]:
+    """Get the backup file names, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if BACKUP_NAME.match(name))
+
+
+def write_backup(users: Iterator[Tuple[str, Dict]], directory: str = BACKUP_DIR,
+                 compression: str = BACKUP_COMPRESSION, keep: int = BACKUP_KEEP) -> Tuple[str, int, int]:
+    """Write captured users to a new backup and delete the oldest ones. Returns (path, size, user count)."""
+    if compression not in COMPRESSORS:
+        raise ValueError(f"Unknown BACKUP_COMPRESSION {compression!r}, use one of: {', '.join(COMPRESSORS)}")
+    extension, opener = COMPRESSORS[compression]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"users-{datetime.now():%Y%m%d-%H%M%S}{extension}")
+    tmp_path = path + ".tmp"
+    try:
+        with opener(tmp_path) as f:
+            count = dump_users_json(users, f)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    for name in list_backups(directory)[:-keep] if keep > 0 else []:
+        os.remove(os.path.join(directory, name))
+    return path, os.path.getsize(path), count
+
+
+async def take_backup() -> Optional[Tuple[str, int, int, float]]:
+    """Back up all users now. Returns (path, size, user count, seconds), or None if one is already running."""
+    global _running
+    if _running:
+        return None
+    _running = True
+    start = perf_counter()
+    try:
+        users = capture_all_users()
+        path, size, count = await asyncio.to_thread(write_backup, users)
+    except Exception:
+        metrics.inc("backups_total", outcome="failed")
+        raise
+    finally:
+        _running = False
+    elapsed = perf_counter() - start
+    metrics.inc("backups_total", outcome="ok")
+    metrics.observe("backup_seconds", elapsed)
+    metrics.set_gauge("backup_size_bytes", size)
+    metrics.set_gauge("backup_users", count)
+    metrics.set_gauge("backup_last_success_timestamp", time())
+    logger.info(f"Backed up {count} users to {path} ({size / 1024:.0f} KB) in {elapsed:.1f} s")
+    return path, size, count, elapsed
+
+
+async def run_backups(interval: float = BACKUP_INTERVAL) -> None:
+    """Take a backup every interval."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await take_backup()
+        except Exception as e:
+            logger.error(f"Error backing up users: {e}")
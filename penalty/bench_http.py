@@ -0,0 +1,100 @@
+"""HTTP client benchmark against a local fake Bot API.
+
+Sends concurrent sendChatAction calls through the same request objects the
+bot uses and compares pool and keep-alive settings.
+
+Usage: python bench_http.py [requests] [concurrency] [latency_ms]
+"""
+import asyncio
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+
+from telegram import Bot
+
+from http_config import API_DEFAULTS, build_request, read_settings
+
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    """Answers getMe with a bot user and every other method with true."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.02
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        sleep(self.latency)
+        result = True
+        if self.path.endswith("/getMe"):
+            result = {"id": 123, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        body = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def run(base_url: str, settings: dict, total: int, concurrency: int) -> dict:
+    """Send total requests with the given concurrency and time them."""
+    bot = Bot("123:fake", base_url=base_url, request=build_request(settings))
+    await bot.initialize()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one_request():
+        nonlocal errors
+        async with semaphore:
+            start = perf_counter()
+            try:
+                await bot.send_chat_action(chat_id=1, action="typing")
+                latencies.append(perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(total)))
+    elapsed = perf_counter() - start
+    await bot.shutdown()
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p95": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+        "errors": errors
+    }
+
+
+def main() -> None:
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    FakeBotAPI.latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/bot"
+
+    defaults = read_settings("BOT_HTTP_", API_DEFAULTS)
+    configs = {
+        "pool 1 (no concurrency)": dict(defaults, pool_size=1, keepalive=1, pool_timeout=60),
+        "pool 8, no keep-alive": dict(defaults, pool_size=8, keepalive=0, pool_timeout=60),
+        "pool 8, keep-alive": dict(defaults, pool_size=8, keepalive=8, pool_timeout=60),
+        "configured (env)": defaults
+    }
+
+    print(f"{total} requests, concurrency {concurrency}, API latency {FakeBotAPI.latency * 1000:.0f} ms")
+    print(f"{'config':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for name, settings in configs.items():
+        result = asyncio.run(run(base_url, settings, total, concurrency))
+        print(f"{name:<26} {result['rps']:>8.0f} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['errors']:>7}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
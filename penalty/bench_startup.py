@@ -0,0 +1,70 @@
+"""Startup benchmark: time to the first tracked interaction after a restart.
+
+Compares a cold start from users_data.json with one from the binary
+snapshot, for growing numbers of users.
+
+Usage: python bench_startup.py [population ...]
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import user_tracker
+
+
+def make_users(count: int) -> dict:
+    """Build a users dict shaped like the real data."""
+    return {
+        str(1000000 + i): {
+            "user_id": 1000000 + i,
+            "username": f"user{i}",
+            "first_name": f"First {i}",
+            "last_name": None if i % 3 else f"Last {i}",
+            "status": user_tracker.STATUS_ACTIVE,
+            "first_seen": "2025-11-15T14:38:11.959429",
+            "last_seen": "2025-11-17T20:25:22.032478",
+            "interaction_count": i % 500
+        }
+        for i in range(count)
+    }
+
+
+def first_interaction(directory: str) -> float:
+    """Start a fresh store and time loading plus one track_user call."""
+    store = user_tracker.UserStore(
+        os.path.join(directory, "users_data.json"),
+        os.path.join(directory, "users_data.snap")
+    )
+    store.write_behind = True  # as in the running bot
+    user_tracker._store = store
+    start = perf_counter()
+    user_tracker.track_user(1000001, "user1", "First 1")
+    elapsed = perf_counter() - start
+    user_tracker._store = None
+    return elapsed
+
+
+def main() -> None:
+    populations = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f"{'users':>10} {'json (ms)':>12} {'snapshot (ms)':>14}")
+    for count in populations:
+        with tempfile.TemporaryDirectory() as directory:
+            store = user_tracker.UserStore(
+                os.path.join(directory, "users_data.json"),
+                os.path.join(directory, "users_data.snap")
+            )
+            store.replace(make_users(count))
+            store.flush()  # writes the JSON file and the snapshot
+
+            os.remove(store.snapshot_path)
+            json_ms = first_interaction(directory) * 1000
+
+            store.mark_changed()
+            store.flush()
+            snapshot_ms = first_interaction(directory) * 1000
+        print(f"{count:>10} {json_ms:>12.2f} {snapshot_ms:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Blocklist module: compact in-memory sets of blocked and muted user IDs.
+
+The sets are sorted arrays of 64-bit IDs (8 bytes per user, binary
+search for lookups), so the pre-dispatch gate can drop an update from a
+blocked user without touching the user store.
+"""
+import os
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+# Also drop updates from muted users, not just keep broadcasts from them
+BLOCK_MUTED_UPDATES = os.getenv("BLOCK_MUTED_UPDATES", "0") == "1"
+
+# Same values as the STATUS_* constants in user_tracker
+STATUS_BLOCKED = "blocked"
+STATUS_MUTED = "muted"
+
+
+class IdSet:
+    """A set of user IDs kept as a sorted array('q')."""
+
+    def __init__(self, user_ids: Iterable[int] = ()):
+        self._ids = array("q", sorted(set(user_ids)))
+
+    def __contains__(self, user_id: int) -> bool:
+        i = bisect_left(self._ids, user_id)
+        return i < len(self._ids) and self._ids[i] == user_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def add(self, user_id: int) -> None:
+        i = bisect_left(self._ids, user_id)
+        if i == len(self._ids) or self._ids[i] != user_id:
+            self._ids.insert(i, user_id)
+
+    def discard(self, user_id: int) -> None:
+        i = bisect_left(self._ids, user_id)
+        if i < len(self._ids) and self._ids[i] == user_id:
+            del self._ids[i]
+
+
+class Blocklist:
+    """Blocked and muted user IDs, updated whenever a status changes."""
+
+    def __init__(self, blocked: Iterable[int] = (), muted: Iterable[int] = (),
+                 block_muted: bool = BLOCK_MUTED_UPDATES):
+        self.blocked = IdSet(blocked)
+        self.muted = IdSet(muted)
+        self.block_muted = block_muted
+
+    def update(self, user_id: int, status: Optional[str]) -> None:
+        """Record a user's new status (None if the user was removed)."""
+        if status == STATUS_BLOCKED:
+            self.blocked.add(user_id)
+        else:
+            self.blocked.discard(user_id)
+        if status == STATUS_MUTED:
+            self.muted.add(user_id)
+        else:
+            self.muted.discard(user_id)
+
+    def check(self, user_id: int) -> Optional[str]:
+        """Get the status an update from this user should be dropped for, or None."""
+        if user_id in self.blocked:
+            return STATUS_BLOCKED
+        if self.block_muted and user_id in self.muted:
+            return STATUS_MUTED
+        return None
@@ -2,27 +2,54 @@ import os
 import logging
 import asyncio
 import random
+import functools
+import html
+from time import perf_counter
 from datetime import datetime
+from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler,
+    ApplicationHandlerStop, filters, ContextTypes
+)
 from telegram.constants import ParseMode
 from dotenv import load_dotenv
-from config import BOT_CONFIG, CUSTOM_MESSAGES
+from templates import get_templates
+from rate_limit import RateLimiter
+from http_config import build_api_request, build_updates_request, BOT_API_BASE_URL
+from outgoing import OutgoingGate, outgoing_lane, LANES, LANE_ANIMATION, LANE_BULK
+from backlog import BacklogDrained, drain_backlog, BACKLOG_DRAIN
+from overload import TimedUpdateQueue, get_overload, run_overload_monitor
+import metrics
+from config_loader import load_config, reload_config, watch_config, CONFIG_WATCH_INTERVAL
 from user_tracker import (
     track_user, get_user_count, get_all_users, get_users_by_status,
     set_user_status, format_user_name, get_status_emoji,
-    add_user_by_id, import_users_from_list,
+    add_user_by_id, import_users_from_list, load_users, get_store, run_write_behind, PendingTrack,
+    get_archive, run_archiver, capture_all_users, durable_restores,
     STATUS_ACTIVE, STATUS_MUTED, STATUS_DELETED, STATUS_BLOCKED
 )
+from profiler import profile_update, get_worst_updates, get_update_type, is_enabled as profiling_enabled
+from analytics import get_analytics, run_analytics_flush
+from backups import take_backup, run_backups, list_backups, BACKUP_INTERVAL, BACKUP_KEEP
+from user_export import ExportOptions, write_export
+from loop_watchdog import LoopWatchdog, WATCHDOG_STALL_MS
+from worker_status import run_status_writer, write_status
+from log_setup import setup_logging, bind_update_context, reset_update_context, stop_logging
+from tracing import (
+    start_trace, span, get_traces, find_trace, summarize, format_trace, dump_traces, stop_tracing,
+    TRACE_SAMPLE
+)
+from shutdown import (
+    install_stop_handler, is_stopping, sleep_unless_stopping, stopping_for, get_inflight,
+    SHUTDOWN_DEADLINE, STARTUP_BUDGET
+)
 
 # Load environment variables
 load_dotenv()
 
-# Enable logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Enable logging (queued, configured via LOG_LEVEL / LOG_FORMAT / LOG_DEBUG_SAMPLE)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Get bot token from environment variable
@@ -38,6 +65,38 @@ if not BOT_TOKEN:
 ADMIN_IDS = [5343481074]  # Admin user ID
 
 
+# Handler groups that run before the regular handlers (group 0)
+GATE_GROUP_DUPLICATES = -30
+GATE_GROUP_BLOCKLIST = -20
+GATE_GROUP_RATE_LIMIT = -10
+GATE_GROUP_ANALYTICS = -5
+GATE_GROUP_TRACKING = -1
+
+# Users shown by /find
+FIND_LIMIT = 10
+
+# Largest file the Bot API accepts from bots
+EXPORT_MAX_BYTES = 50 * 1024 * 1024
+
+# Trace names shown by /trace
+TRACE_SUMMARY_LIMIT = 15
+
+# Callback data with these prefixes carries arguments (keypad digits, user text);
+# analytics and traces name the route by the prefix only
+CALLBACK_BRANCH_PREFIXES = (
+    "pwd_", "echo_", "open_script_", "script_instructions_", "download_script_",
+    "back_to_script_menu_", "filter_", "moderate_"
+)
+
+# Outgoing lanes whose waits count towards overload; broadcasts are meant to wait
+OVERLOAD_LANES = tuple(lane for lane in LANES if lane != LANE_BULK)
+
+rate_limiter = RateLimiter()
+
+# For the restart-to-ready time
+STARTED_AT = perf_counter()
+
+
 def is_admin(user_id: int) -> bool:
     """Check if user is admin."""
     if len(ADMIN_IDS) == 0:
@@ -49,17 +108,138 @@ def track_user_interaction(update: Update) -> None:
     """Track user interaction."""
     user = update.effective_user
     if user:
-        track_user(
-            user_id=user.id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name
+        overload = get_overload()
+        if overload.degraded and str(user.id) in get_store():
+            # Known user: add up the interactions and write them once the pressure drops
+            pending = overload.deferred(user.id)
+            if pending is not None:
+                pending.add(user.username, user.first_name, user.last_name)
+            else:
+                pending = PendingTrack(user.id)
+                pending.add(user.username, user.first_name, user.last_name)
+                overload.defer(user.id, pending)
+        else:
+            # New (or archived) users are written right away, so they exist before anything looks them up
+            track_user(user.id, user.username, user.first_name, user.last_name)
+
+
+def sample_outgoing_wait(lane: str, wait_ms: float) -> None:
+    """Report how long a Bot API request waited for its turn to the overload controller."""
+    if lane in OVERLOAD_LANES:
+        get_overload().sample_outgoing(lane, wait_ms)
+
+
+def instrumented(callback):
+    """Wrap a handler callback with logging context and profiling."""
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user if isinstance(update, Update) else None
+        token = bind_update_context(
+            update_id=getattr(update, "update_id", None),
+            user_id=user.id if user else None,
+            handler=callback.__name__
         )
+        start_time = perf_counter()
+        try:
+            with span(f"handler.{callback.__name__}"):
+                return await profile_update(callback, update, context)
+        finally:
+            duration_ms = round((perf_counter() - start_time) * 1000, 1)
+            logger.debug("Update handled", extra={"duration_ms": duration_ms})
+            reset_update_context(token)
+    return wrapper
+
+
+class TracedApplication(Application):
+    """Application that traces every update and records it as handled once its handlers finished."""
+
+    async def process_update(self, update: object) -> None:
+        if not isinstance(update, Update):
+            await super().process_update(update)
+            return
+        user = update.effective_user
+        with start_trace(
+            get_route(update),
+            update_id=update.update_id,
+            user_id=user.id if user else None,
+            queue_ms=round(self.update_queue.last_wait_ms, 1)
+        ):
+            await super().process_update(update)
+        # Not before: an update cut short by a crash is handled again after the restart
+        get_store().updates.add(update.update_id)
+
+
+async def duplicate_update_gate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Skip updates that were already handled before a restart (recorded by TracedApplication)."""
+    if get_store().updates.seen(update.update_id):
+        metrics.inc("updates_rejected_total", reason="already_handled")
+        raise ApplicationHandlerStop
+
+
+async def blocklist_gate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop updates from blocked users before any handler or storage work."""
+    user = update.effective_user
+    if user is None:
+        return
+    
+    reason = get_store().blocklist.check(user.id)
+    if reason is None or is_admin(user.id):
+        return
+    
+    metrics.inc("updates_rejected_total", reason=reason)
+    raise ApplicationHandlerStop
+
+
+async def rate_limit_gate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop updates from users who send too much, before any handler runs."""
+    user = update.effective_user
+    if user is None or is_admin(user.id):
+        return
+    
+    reason = rate_limiter.check(update)
+    if reason is None:
+        return
+    
+    metrics.inc("updates_rejected_total", reason=reason)
+    if update.callback_query:
+        # Stop the client's loading spinner, nothing else
+        try:
+            await update.callback_query.answer()
+        except Exception:
+            pass
+    raise ApplicationHandlerStop
+
+
+def get_route(update: Update) -> str:
+    """Get the route of an update: /command, callback:data (one name per branch) or the update type."""
+    message = update.message
+    if message and message.text and message.text.startswith("/"):
+        return message.text.split()[0].split("@")[0].lower()
+    if update.callback_query and update.callback_query.data is not None:
+        data = update.callback_query.data
+        for prefix in CALLBACK_BRANCH_PREFIXES:
+            if data.startswith(prefix):
+                return f"callback:{prefix}*"
+        return f"callback:{data}"
+    return get_update_type(update)
+
+
+async def analytics_gate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Count every update that got past the other gates in the analytics rollups."""
+    user = update.effective_user
+    get_analytics().record(user.id if user else None, get_route(update))
+
+
+async def tracking_gate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Track the user once per update, so handlers don't have to."""
+    if update.effective_message is None and update.callback_query is None:
+        # Membership changes, inline queries and the like never reach a handler
+        return
+    track_user_interaction(update)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
-    track_user_interaction(update)
     user = update.effective_user
     
     # Welcome message with chicken script button
@@ -80,39 +260,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /help is issued."""
-    track_user_interaction(update)
-    if CUSTOM_MESSAGES["help"]:
-        help_text = CUSTOM_MESSAGES["help"]
-    else:
-        help_text = """
-<b>📚 Available Commands</b>
-
-<b>Main Commands:</b>
-<code>/start</code> - Start the bot and see welcome message
-<code>/help</code> - Show this help message
-<code>/info</code> - Get bot information
-<code>/status</code> - Check bot status
-
-<b>Script Commands:</b>
-<code>/chicken</code> - Get chicken script information 🐔
-<code>/mines</code> - Get mines script information 💎
-<code>/icefield</code> - Get icefield script information 🐼
-
-<b>Other Commands:</b>
-<code>/contact</code> - Contact information
-<code>/download</code> - Download information
-<code>/echo &lt;text&gt;</code> - Echo back your message
-<code>/style</code> - See formatting examples
-<code>/buttons</code> - Interactive button demo
-
-<b>💡 Tip:</b> You can also use the inline buttons for quick access!
-        """
+    help_text = get_templates().help_text
     await update.message.reply_text(help_text, parse_mode=ParseMode.HTML)
 
 
 async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Echo the user message."""
-    track_user_interaction(update)
     # Get the text after /echo command
     if context.args:
         text = ' '.join(context.args)
@@ -130,7 +283,6 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def style_demo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show formatting examples."""
-    track_user_interaction(update)
     style_message = """
 <b>🎨 Formatting Examples</b>
 
@@ -151,7 +303,6 @@ async def style_demo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
 async def buttons_demo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show interactive buttons demo."""
-    track_user_interaction(update)
     keyboard = [
         [
             InlineKeyboardButton("✅ Option 1", callback_data="option1"),
@@ -173,114 +324,216 @@ async def buttons_demo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 async def chicken_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send chicken script information."""
-    track_user_interaction(update)
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
-    message = config.get("command_messages", {}).get("chicken", "<b>🐔 Script Chicken</b>\n\nInformation coming soon!")
-    
-    # Add back button (centered for better appearance)
-    keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_start")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(message, parse_mode=parse_mode, reply_markup=reply_markup)
+    template = get_templates().commands["chicken"]
+    await update.message.reply_text(template.text, parse_mode=template.parse_mode, reply_markup=template.reply_markup)
 
 
 async def mines_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send mines script information."""
-    track_user_interaction(update)
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
-    message = config.get("command_messages", {}).get("mines", "<b>💎 Script Mines</b>\n\nInformation coming soon!")
-    
-    # Add back button (centered for better appearance)
-    keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_start")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(message, parse_mode=parse_mode, reply_markup=reply_markup)
+    template = get_templates().commands["mines"]
+    await update.message.reply_text(template.text, parse_mode=template.parse_mode, reply_markup=template.reply_markup)
 
 
 async def icefield_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send icefield script information."""
-    track_user_interaction(update)
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
-    message = config.get("command_messages", {}).get("icefield", "<b>🐼 Script Icefield</b>\n\nInformation coming soon!")
-    
-    # Add back button (centered for better appearance)
-    keyboard = [[InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_start")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(message, parse_mode=parse_mode, reply_markup=reply_markup)
+    template = get_templates().commands["icefield"]
+    await update.message.reply_text(template.text, parse_mode=template.parse_mode, reply_markup=template.reply_markup)
 
 
 async def info_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send bot information."""
-    track_user_interaction(update)
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
-    message = config.get("command_messages", {}).get("info", "<b>ℹ️ Bot Information</b>\n\nInformation coming soon!")
-    
-    await update.message.reply_text(message, parse_mode=parse_mode)
+    template = get_templates().commands["info"]
+    await update.message.reply_text(template.text, parse_mode=template.parse_mode, reply_markup=template.reply_markup)
 
 
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send bot status."""
-    track_user_interaction(update)
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
-    message = config.get("command_messages", {}).get("status", "<b>📊 Bot Status</b>\n\nStatus: Online ✅")
-    
-    await update.message.reply_text(message, parse_mode=parse_mode)
+    template = get_templates().commands["status"]
+    await update.message.reply_text(template.text, parse_mode=template.parse_mode, reply_markup=template.reply_markup)
 
 
 async def contact_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send contact information."""
-    track_user_interaction(update)
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
-    message = config.get("command_messages", {}).get("contact", "<b>📞 Contact Information</b>\n\nContact info coming soon!")
-    
-    await update.message.reply_text(message, parse_mode=parse_mode)
+    template = get_templates().commands["contact"]
+    await update.message.reply_text(template.text, parse_mode=template.parse_mode, reply_markup=template.reply_markup)
 
 
 async def download_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send download information."""
-    track_user_interaction(update)
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
-    message = config.get("command_messages", {}).get("download", "<b>⬇️ Download Information</b>\n\nDownload info coming soon!")
+    template = get_templates().commands["download"]
+    await update.message.reply_text(template.text, parse_mode=template.parse_mode, reply_markup=template.reply_markup)
+
+
+async def animate_loading_bar(edit_text, render) -> None:
+    """Animate a loading bar for 5-12 seconds, ending at 100%.
     
-    # Add script buttons (better organized layout)
-    keyboard = [
+    render(bar, progress) builds the text and edit_text(text) shows it.
+    """
+    with outgoing_lane(LANE_ANIMATION), span("animation") as animation_span:
+        total_seconds = random.randint(5, 12)
+        bar_length = 10
+        current_progress = 0
+        
+        for i in range(total_seconds):
+            if is_stopping() or get_overload().degraded:
+                # Jump to the result so shutdown or the other users' replies aren't held up
+                metrics.inc("animations_cut_total")
+                if animation_span is not None:
+                    animation_span.set(cut=True)
+                break
+            
+            # Random increment between 5-20%
+            increment = random.randint(5, 20)
+            current_progress = min(100, current_progress + increment)
+            
+            # Calculate filled bars
+            filled = int((current_progress / 100) * bar_length)
+            empty = bar_length - filled
+            bar = "█" * filled + "░" * empty
+            
+            try:
+                await edit_text(render(bar, current_progress))
+            except:
+                pass
+            
+            # Random delay between 0.5-1.5 seconds
+            await sleep_unless_stopping(random.uniform(0.5, 1.5))
+        
+        # Ensure 100% at the end (skipped when cut short, the next step replaces the bar anyway)
+        if not is_stopping() and not get_overload().degraded:
+            try:
+                await edit_text(render("█" * bar_length, 100))
+            except:
+                pass
+
+
+async def show_chicken_menu(bot, chat_id: int, message_id: int, loading_message_id: Optional[int]) -> None:
+    """Replace the chicken script loading bar (if one was shown) with the script menu."""
+    # Delete only the loading bar message
+    if loading_message_id is not None:
+        try:
+            await bot.delete_message(chat_id=chat_id, message_id=loading_message_id)
+        except:
+            pass
+    
+    # Show 4 buttons after loading completes - edit the original message (2x2 grid for better appearance)
+    buttons_keyboard = [
         [
-            InlineKeyboardButton("🐔 Chicken", callback_data="help"),
-            InlineKeyboardButton("💎 Mines", callback_data="settings")
+            InlineKeyboardButton("𝐒𝐂𝐑𝐈𝐏𝐓 𝐂𝐇𝐈𝐂𝐊𝐄𝐍 🐔", callback_data="open_script_panel"),
+            InlineKeyboardButton("𝑩𝑼𝒀 𝑺𝑪𝑹𝑰𝑷𝑻 💰", callback_data="buy_script")
         ],
         [
-            InlineKeyboardButton("🐼 Icefield", callback_data="about")
+            InlineKeyboardButton("𝑰𝑵𝑺𝑻𝑨𝑮𝑹𝑨𝑴 📲", url="https://www.instagram.com/ilyass_fadelly?igsh=b3h6d2wzbGZ3OTFt"),
+            InlineKeyboardButton("𝑻𝑬𝑳𝑬𝑮𝑹𝑨𝑴 📞", callback_data="telegram")
         ]
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    buttons_markup = InlineKeyboardMarkup(buttons_keyboard)
     
-    await update.message.reply_text(message, parse_mode=parse_mode, reply_markup=reply_markup)
+    await bot.edit_message_text(
+        "𝑪𝑯𝑶𝑶𝑺𝑬 𝑶𝑵𝑬 :",
+        chat_id=chat_id,
+        message_id=message_id,
+        reply_markup=buttons_markup,
+        parse_mode=ParseMode.HTML
+    )
+
+
+async def show_password_keypad(bot, chat_id: int, message_id: int, script_btn: str) -> None:
+    """Replace a script loading bar with the password keypad."""
+    button_names = {
+        "script_btn_1": "IPHONE 🍎",
+        "script_btn_2": "ANDROID 🤖",
+        "script_btn_3": "WINDOWS 💻",
+        "script_btn_4": "MACBOOK 🖥️"
+    }
+    button_name = button_names.get(script_btn, "Script")
+    
+    # Fixed password
+    password = "2704"
+    entered = ""  # Start with empty entered digits
+    
+    # Show password keypad
+    password_keyboard = [
+        [
+            InlineKeyboardButton("1", callback_data=f"pwd_{script_btn}_{password}_{entered}_1"),
+            InlineKeyboardButton("2", callback_data=f"pwd_{script_btn}_{password}_{entered}_2"),
+            InlineKeyboardButton("3", callback_data=f"pwd_{script_btn}_{password}_{entered}_3")
+        ],
+        [
+            InlineKeyboardButton("4", callback_data=f"pwd_{script_btn}_{password}_{entered}_4"),
+            InlineKeyboardButton("5", callback_data=f"pwd_{script_btn}_{password}_{entered}_5"),
+            InlineKeyboardButton("6", callback_data=f"pwd_{script_btn}_{password}_{entered}_6")
+        ],
+        [
+            InlineKeyboardButton("7", callback_data=f"pwd_{script_btn}_{password}_{entered}_7"),
+            InlineKeyboardButton("8", callback_data=f"pwd_{script_btn}_{password}_{entered}_8"),
+            InlineKeyboardButton("9", callback_data=f"pwd_{script_btn}_{password}_{entered}_9")
+        ],
+        [
+            InlineKeyboardButton("0", callback_data=f"pwd_{script_btn}_{password}_{entered}_0"),
+            InlineKeyboardButton("⌫", callback_data=f"pwd_{script_btn}_{password}_{entered}_back"),
+            InlineKeyboardButton("🗑️", callback_data=f"pwd_{script_btn}_{password}_{entered}_clear")
+        ],
+        [InlineKeyboardButton("🔙 Back", callback_data="back_to_script_panel")]
+    ]
+    password_markup = InlineKeyboardMarkup(password_keyboard)
+    
+    # Display password entry (show entered digits, hide rest)
+    display = entered + "•" * (4 - len(entered)) if len(entered) < 4 else entered
+    
+    # Edit the original message to show password keypad (this removes the previous buttons)
+    await bot.edit_message_text(
+        f"🔐 <b>𝑷𝑨𝑺𝑺𝑾𝑶𝑹𝑫 𝑪𝑶𝑫𝑬 🔐</b>\n\n{button_name} is ready!\n\n<b>Enter 4-digit password:</b>\n<code>{display}</code>",
+        chat_id=chat_id,
+        message_id=message_id,
+        reply_markup=password_markup,
+        parse_mode=ParseMode.HTML
+    )
+
+
+# Finishes a flow saved by shutdown.InFlight, by kind
+INFLIGHT_FINISHERS = {
+    "chicken_menu": lambda bot, entry: show_chicken_menu(
+        bot, entry["chat_id"], entry["message_id"], entry["loading_message_id"]),
+    "password_keypad": lambda bot, entry: show_password_keypad(
+        bot, entry["chat_id"], entry["message_id"], entry["script_btn"])
+}
+
+
+async def resume_inflight(bot, entries) -> None:
+    """Finish the flows the previous process left with a loading bar on screen."""
+    inflight = get_inflight()
+    finished = 0
+    for entry in entries:
+        finisher = INFLIGHT_FINISHERS.get(entry.get("kind"))
+        if finisher is None:
+            continue
+        key = inflight.add(**entry)
+        try:
+            await finisher(bot, entry)
+            finished += 1
+        except Exception as e:
+            logger.warning(f"Could not finish a {entry['kind']} flow after restart: {e}")
+        finally:
+            inflight.discard(key)
+    logger.info(f"Finished {finished} of {len(entries)} flows left by the previous process")
 
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle button callbacks."""
-    track_user_interaction(update)
     query = update.callback_query
     await query.answer()  # Acknowledge the callback
     
     # Get button action from config
     button_data = query.data
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
+    templates = get_templates()
+    parse_mode = templates.parse_mode
     
     # Check if button has custom action in config
-    if "button_actions" in config and button_data in config["button_actions"]:
-        action = config["button_actions"][button_data]
-        action_type = action.get("type", "message")
-        content = action.get("content", "")
+    if button_data in templates.button_actions:
+        action = templates.button_actions[button_data]
+        action_type = action.type
+        content = action.content
         
         if action_type == "message":
             # Show a message (edits the current message)
@@ -313,18 +566,7 @@ Customize your bot experience here.
         await query.edit_message_text(settings_text, parse_mode=parse_mode)
     
     elif button_data == "about":
-        if CUSTOM_MESSAGES["about"]:
-            about_text = CUSTOM_MESSAGES["about"]
-        else:
-            about_text = f"""
-<b>{BOT_CONFIG['info_emoji']} About</b>
-
-This is a customizable Telegram bot.
-You can style it however you want!
-
-Edit <code>config.py</code> to customize messages and styling.
-            """
-        await query.edit_message_text(about_text, parse_mode=parse_mode)
+        await query.edit_message_text(templates.about_text, parse_mode=parse_mode)
     
     elif query.data == "option1":
         await query.answer("You selected Option 1! ✅", show_alert=True)
@@ -353,6 +595,13 @@ Edit <code>config.py</code> to customize messages and styling.
             parse_mode=ParseMode.HTML
         )
         
+        chat_id = query.message.chat.id
+        if get_overload().degraded:
+            # Overloaded: no loading bar, straight to the menu
+            metrics.inc("animations_skipped_total")
+            await show_chicken_menu(context.bot, chat_id, query.message.message_id, None)
+            return
+        
         # Show loading bar as separate message
         loading_msg = await query.message.reply_text(
             "𝑷𝑳𝑬𝑨𝑺𝑬 𝑾𝑨𝑰𝑻 ⏳...\n[░░░░░░░░░░] 0%",
@@ -360,67 +609,22 @@ Edit <code>config.py</code> to customize messages and styling.
         )
         
         # Random loading bar animation - random duration between 5-12 seconds
-        total_seconds = random.randint(5, 12)
-        bar_length = 10
-        current_progress = 0
+        inflight = get_inflight()
+        key = inflight.add("chicken_menu", chat_id=chat_id, message_id=query.message.message_id,
+                           loading_message_id=loading_msg.message_id)
         
-        for i in range(total_seconds):
-            # Random increment between 5-20%
-            increment = random.randint(5, 20)
-            current_progress = min(100, current_progress + increment)
-            
-            # Calculate filled bars
-            filled = int((current_progress / 100) * bar_length)
-            empty = bar_length - filled
-            
-            # Create loading bar
-            bar = "█" * filled + "░" * empty
-            
+        async def finish_chicken_menu():
             try:
-                await loading_msg.edit_text(
-                    f"𝑷𝑳𝑬𝑨𝑺𝑬 𝑾𝑨𝑰𝑻 ⏳...\n[{bar}] {current_progress}%",
-                    parse_mode=ParseMode.HTML
+                await animate_loading_bar(
+                    lambda text: loading_msg.edit_text(text, parse_mode=ParseMode.HTML),
+                    lambda bar, progress: f"𝑷𝑳𝑬𝑨𝑺𝑬 𝑾𝑨𝑰𝑻 ⏳...\n[{bar}] {progress}%"
                 )
-            except:
-                pass
-            
-            # Random delay between 0.5-1.5 seconds
-            await asyncio.sleep(random.uniform(0.5, 1.5))
-        
-        # Ensure 100% at the end
-        try:
-            await loading_msg.edit_text(
-                f"𝑷𝑳𝑬𝑨𝑺𝑬 𝑾𝑨𝑰𝑻 ⏳...\n[██████████] 100%",
-                parse_mode=ParseMode.HTML
-            )
-        except:
-            pass
-        
-        # Delete only the loading bar message
-        chat_id = query.message.chat.id
-        try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=loading_msg.message_id)
-        except:
-            pass
-        
-        # Show 4 buttons after loading completes - edit the original message (2x2 grid for better appearance)
-        buttons_keyboard = [
-            [
-                InlineKeyboardButton("𝐒𝐂𝐑𝐈𝐏𝐓 𝐂𝐇𝐈𝐂𝐊𝐄𝐍 🐔", callback_data="open_script_panel"),
-                InlineKeyboardButton("𝑩𝑼𝒀 𝑺𝑪𝑹𝑰𝑷𝑻 💰", callback_data="buy_script")
-            ],
-            [
-                InlineKeyboardButton("𝑰𝑵𝑺𝑻𝑨𝑮𝑹𝑨𝑴 📲", url="https://www.instagram.com/ilyass_fadelly?igsh=b3h6d2wzbGZ3OTFt"),
-                InlineKeyboardButton("𝑻𝑬𝑳𝑬𝑮𝑹𝑨𝑴 📞", callback_data="telegram")
-            ]
-        ]
-        buttons_markup = InlineKeyboardMarkup(buttons_keyboard)
+                await show_chicken_menu(context.bot, chat_id, query.message.message_id, loading_msg.message_id)
+            finally:
+                inflight.discard(key)
         
-        await query.edit_message_text(
-            "𝑪𝑯𝑶𝑶𝑺𝑬 𝑶𝑵𝑬 :",
-            reply_markup=buttons_markup,
-            parse_mode=ParseMode.HTML
-        )
+        # Updates are processed one at a time: animate in the background so others aren't held up
+        context.application.create_task(finish_chicken_menu(), update=update, name="chicken_menu")
     
     elif query.data == "open_script_panel":
         await query.answer("Opening script panel...")
@@ -456,6 +660,12 @@ Edit <code>config.py</code> to customize messages and styling.
         }
         button_name = button_names.get(query.data, "Script")
         
+        if get_overload().degraded:
+            # Overloaded: no loading bar, straight to the keypad
+            metrics.inc("animations_skipped_total")
+            await show_password_keypad(context.bot, query.message.chat.id, query.message.message_id, query.data)
+            return
+        
         # Edit the original message to remove buttons and show loading
         await query.edit_message_text(
             f"⏳ <b>Loading {button_name}...</b>\n\n[░░░░░░░░░░] 0%",
@@ -463,82 +673,26 @@ Edit <code>config.py</code> to customize messages and styling.
         )
         
         # Random loading bar animation - random duration between 5-12 seconds
-        total_seconds = random.randint(5, 12)
-        bar_length = 10
-        current_progress = 0
+        inflight = get_inflight()
+        key = inflight.add("password_keypad", chat_id=query.message.chat.id, message_id=query.message.message_id,
+                           script_btn=query.data)
         
-        for i in range(total_seconds):
-            # Random increment between 5-20%
-            increment = random.randint(5, 20)
-            current_progress = min(100, current_progress + increment)
-            
-            # Calculate filled bars
-            filled = int((current_progress / 100) * bar_length)
-            empty = bar_length - filled
-            bar = "█" * filled + "░" * empty
-            
-            # Update the loading bar in the original message
+        async def finish_password_keypad():
             try:
-                await query.edit_message_text(
-                    f"⏳ <b>Loading {button_name}...</b>\n\n[{bar}] {current_progress}%",
-                    parse_mode=ParseMode.HTML
+                await animate_loading_bar(
+                    lambda text: query.edit_message_text(text, parse_mode=ParseMode.HTML),
+                    lambda bar, progress: f"⏳ <b>Loading {button_name}...</b>\n\n[{bar}] {progress}%"
                 )
-            except:
-                pass
-            
-            # Random delay between 0.5-1.5 seconds
-            await asyncio.sleep(random.uniform(0.5, 1.5))
-        
-        # Ensure 100% at the end
-        try:
-            await query.edit_message_text(
-                f"⏳ <b>Loading {button_name}...</b>\n\n[██████████] 100%",
-                parse_mode=ParseMode.HTML
-            )
-        except:
-            pass
-        
-        await asyncio.sleep(0.5)
-        
-        # Fixed password
-        password = "2704"
-        entered = ""  # Start with empty entered digits
-        
-        # Show password keypad
-        password_keyboard = [
-            [
-                InlineKeyboardButton("1", callback_data=f"pwd_{query.data}_{password}_{entered}_1"),
-                InlineKeyboardButton("2", callback_data=f"pwd_{query.data}_{password}_{entered}_2"),
-                InlineKeyboardButton("3", callback_data=f"pwd_{query.data}_{password}_{entered}_3")
-            ],
-            [
-                InlineKeyboardButton("4", callback_data=f"pwd_{query.data}_{password}_{entered}_4"),
-                InlineKeyboardButton("5", callback_data=f"pwd_{query.data}_{password}_{entered}_5"),
-                InlineKeyboardButton("6", callback_data=f"pwd_{query.data}_{password}_{entered}_6")
-            ],
-            [
-                InlineKeyboardButton("7", callback_data=f"pwd_{query.data}_{password}_{entered}_7"),
-                InlineKeyboardButton("8", callback_data=f"pwd_{query.data}_{password}_{entered}_8"),
-                InlineKeyboardButton("9", callback_data=f"pwd_{query.data}_{password}_{entered}_9")
-            ],
-            [
-                InlineKeyboardButton("0", callback_data=f"pwd_{query.data}_{password}_{entered}_0"),
-                InlineKeyboardButton("⌫", callback_data=f"pwd_{query.data}_{password}_{entered}_back"),
-                InlineKeyboardButton("🗑️", callback_data=f"pwd_{query.data}_{password}_{entered}_clear")
-            ],
-            [InlineKeyboardButton("🔙 Back", callback_data="back_to_script_panel")]
-        ]
-        password_markup = InlineKeyboardMarkup(password_keyboard)
-        
-        # Display password entry (show entered digits, hide rest)
-        display = entered + "•" * (4 - len(entered)) if len(entered) < 4 else entered
+                
+                if not get_overload().degraded:
+                    await sleep_unless_stopping(0.5)
+                
+                await show_password_keypad(context.bot, query.message.chat.id, query.message.message_id, query.data)
+            finally:
+                inflight.discard(key)
         
-        # Edit the original message to show password keypad (this removes the previous buttons)
-        await query.edit_message_text(
-            f"🔐 <b>𝑷𝑨𝑺𝑺𝑾𝑶𝑹𝑫 𝑪𝑶𝑫𝑬 🔐</b>\n\n{button_name} is ready!\n\n<b>Enter 4-digit password:</b>\n<code>{display}</code>",
-            reply_markup=password_markup,
-            parse_mode=ParseMode.HTML
-        )
+        # Animate in the background, like the chicken menu
+        context.application.create_task(finish_password_keypad(), update=update, name="password_keypad")
     
     elif query.data.startswith("pwd_"):
         # Handle password keypad clicks
@@ -928,7 +1082,6 @@ Contact: @fadelly
             return
         
         filter_type = query.data.replace("filter_", "")
-        track_user_interaction(update)
         
         if filter_type == "all":
             filtered_users = get_all_users()
@@ -951,6 +1104,9 @@ Contact: @fadelly
 <b>Total: {len(filtered_users)}</b>
 
 """
+        archived_count = get_archive().count_by_status().get("total" if filter_type == "all" else filter_type, 0)
+        if archived_count:
+            message += f"<i>📦 {archived_count} more in the archive, not listed here (find them by ID with /find)</i>\n\n"
         
         if len(filtered_users) == 0:
             message += "<i>No users found.</i>"
@@ -996,41 +1152,33 @@ Contact: @fadelly
         
         await query.edit_message_text(message, parse_mode=parse_mode, reply_markup=reply_markup)
     
-    elif query.data == "back_to_start":
-        # Return to start menu
-        track_user_interaction(update)
+    elif query.data.startswith("moderate_"):
+        # Change a user's status from /find results (admin only)
         user = update.effective_user
-        config = BOT_CONFIG
-        keyboard = [
-            [
-                InlineKeyboardButton(config["button_labels"]["help"], callback_data="help"),
-                InlineKeyboardButton(config["button_labels"]["settings"], callback_data="settings")
-            ],
-            [
-                InlineKeyboardButton(config["button_labels"]["about"], callback_data="about")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        if not is_admin(user.id):
+            await query.answer("❌ Admin only!", show_alert=True)
+            return
         
-        if CUSTOM_MESSAGES["start"]:
-            welcome_message = CUSTOM_MESSAGES["start"].format(first_name=user.first_name)
+        _, status, target_user_id = query.data.split("_", 2)
+        if set_user_status(int(target_user_id), status):
+            await query.message.reply_text(
+                f"{get_status_emoji(status)} User <code>{target_user_id}</code> is now <b>{status}</b>.",
+                parse_mode=ParseMode.HTML
+            )
         else:
-            features_text = "\n".join([f"• {feature}" for feature in config["features"]])
-            welcome_message = f"""
-<b>{config['welcome_emoji']} {config['welcome_title']}, {user.first_name}!</b>
-
-<i>{config['welcome_subtitle']}</i>
-
-{config['primary_emoji']} <b>Features:</b>
-{features_text}
-            """
+            await query.message.reply_text(f"❌ User {target_user_id} not found.", parse_mode=ParseMode.HTML)
+    
+    elif query.data == "back_to_start":
+        # Return to start menu
+        user = update.effective_user
+        welcome = templates.welcome
+        welcome_message = welcome.render(user.first_name)
         
-        await query.edit_message_text(welcome_message, reply_markup=reply_markup, parse_mode=parse_mode)
+        await query.edit_message_text(welcome_message, reply_markup=welcome.reply_markup, parse_mode=welcome.parse_mode)
 
 
 async def mute_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mute a user (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     if not is_admin(user.id):
@@ -1056,7 +1204,6 @@ async def mute_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def unmute_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Unmute a user (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     if not is_admin(user.id):
@@ -1082,7 +1229,6 @@ async def unmute_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def delete_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mark a user as deleted (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     if not is_admin(user.id):
@@ -1108,7 +1254,6 @@ async def delete_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def block_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Block a user (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     if not is_admin(user.id):
@@ -1134,7 +1279,6 @@ async def block_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show user's Telegram ID."""
-    track_user_interaction(update)
     user = update.effective_user
     
     message = f"""<b>🆔 Your Telegram ID</b>
@@ -1156,7 +1300,6 @@ async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 async def sendtothem_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send message or media to all subscribers (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     # Check if user is admin
@@ -1168,11 +1311,17 @@ async def sendtothem_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if update.message.reply_to_message:
         # Forward the replied message/media to all subscribers
         replied_message = update.message.reply_to_message
-        await send_to_all_subscribers(update, context, replied_message)
+        # Broadcasts run in the background so other updates are handled meanwhile
+        # (at most once: a crash mid-broadcast leaves the rest unsent, see update_ledger)
+        context.application.create_task(
+            send_to_all_subscribers(update, context, replied_message), update=update, name="broadcast"
+        )
     elif context.args:
         # Send text message
         text_message = ' '.join(context.args)
-        await send_text_to_all_subscribers(update, context, text_message)
+        context.application.create_task(
+            send_text_to_all_subscribers(update, context, text_message), update=update, name="broadcast"
+        )
     else:
         # Show usage instructions
         usage_text = """<b>📤 Send to All Subscribers</b>
@@ -1228,8 +1377,7 @@ async def send_text_to_all_subscribers(update: Update, context: ContextTypes.DEF
         parse_mode=ParseMode.HTML
     )
     
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
+    parse_mode = get_templates().parse_mode
     
     success_count = 0
     failed_count = 0
@@ -1242,7 +1390,8 @@ async def send_text_to_all_subscribers(update: Update, context: ContextTypes.DEF
                 await context.bot.send_message(
                     chat_id=user_id,
                     text=text,
-                    parse_mode=parse_mode
+                    parse_mode=parse_mode,
+                    rate_limit_args=LANE_BULK
                 )
                 success_count += 1
         except Exception as e:
@@ -1289,7 +1438,8 @@ async def send_to_all_subscribers(update: Update, context: ContextTypes.DEFAULT_
                 await context.bot.forward_message(
                     chat_id=user_id,
                     from_chat_id=message_to_forward.chat_id,
-                    message_id=message_to_forward.message_id
+                    message_id=message_to_forward.message_id,
+                    rate_limit_args=LANE_BULK
                 )
                 success_count += 1
         except Exception as e:
@@ -1311,7 +1461,6 @@ async def send_to_all_subscribers(update: Update, context: ContextTypes.DEFAULT_
 
 async def import_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Import users from a list of user IDs (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     # Check if user is admin
@@ -1358,7 +1507,6 @@ async def import_users_command(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def import_users_file_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Import users from a text file (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     # Check if user is admin
@@ -1385,7 +1533,6 @@ async def import_users_file_command(update: Update, context: ContextTypes.DEFAUL
 
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle document uploads for user import (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     # Only process if admin
@@ -1445,7 +1592,6 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def add_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Add a single user by ID (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     # Check if user is admin
@@ -1492,7 +1638,6 @@ async def add_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
 async def subscribers_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show subscribers list with status (admin only)."""
-    track_user_interaction(update)
     user = update.effective_user
     
     # Check if user is admin
@@ -1564,15 +1709,272 @@ async def subscribers_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         if len(all_users) > 20:
             message += f"\n<i>... and {len(all_users) - 20} more users</i>"
     
-    config = BOT_CONFIG
-    parse_mode = ParseMode.HTML if config["use_html"] else ParseMode.MARKDOWN_V2
+    parse_mode = get_templates().parse_mode
     
     await update.message.reply_text(message, parse_mode=parse_mode, reply_markup=reply_markup)
 
 
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Find subscribers by name, username or ID (admin only)."""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ You don't have permission to use this command. Admin only.", parse_mode=ParseMode.HTML)
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            "❌ Please provide a name, username or ID.\n\n<code>Usage: /find &lt;query&gt;</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    query_text = " ".join(context.args)
+    store = get_store()
+    search_index = store.search_index
+    # Never wait for the index here, that would hold up every other update
+    index_ready = search_index.ensure_built(store.view)
+    
+    start_time = perf_counter()
+    user_ids = search_index.search(query_text, FIND_LIMIT)
+    # Only the store's names are indexed; an exact ID also finds archived users
+    archived = {}
+    if query_text.isdigit():
+        query_id = int(query_text)
+        if query_text not in store:
+            archived_user = get_archive().get(query_id)
+            if archived_user is not None:
+                archived[query_id] = archived_user
+        if query_text in store or archived:
+            user_ids = [query_id] + [user_id for user_id in user_ids if user_id != query_id]
+    elapsed_ms = (perf_counter() - start_time) * 1000
+    
+    message = f"<b>🔎 Search: {html.escape(query_text)}</b>\n"
+    keyboard = []
+    if not user_ids and not index_ready:
+        message += "\n<i>⏳ The search index is still being built, try again in a few seconds.</i>"
+    elif not user_ids:
+        message += "\n<i>No users found.</i>"
+    for i, user_id in enumerate(user_ids[:FIND_LIMIT], 1):
+        user_data = store.peek(str(user_id)) or archived.get(user_id)
+        if user_data is None:
+            continue
+        status_emoji = get_status_emoji(user_data.get("status", STATUS_ACTIVE))
+        last_seen = (user_data.get("last_seen") or "Never")[:16].replace("T", " ")
+        message += f"\n{i}. {status_emoji} <b>{html.escape(format_user_name(user_data))}</b>"
+        message += " 📦 archived\n" if user_id in archived else "\n"
+        message += f"   ID: <code>{user_id}</code> | Last seen: {last_seen}\n"
+        keyboard.append([
+            InlineKeyboardButton(f"{i}. 🔇 Mute", callback_data=f"moderate_{STATUS_MUTED}_{user_id}"),
+            InlineKeyboardButton("✅ Unmute", callback_data=f"moderate_{STATUS_ACTIVE}_{user_id}"),
+            InlineKeyboardButton("🚫 Block", callback_data=f"moderate_{STATUS_BLOCKED}_{user_id}")
+        ])
+    message += f"\n<i>Searched in {elapsed_ms:.1f} ms</i>"
+    
+    await update.message.reply_text(
+        message,
+        reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None,
+        parse_mode=ParseMode.HTML
+    )
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send subscribers as a CSV or NDJSON file (admin only)."""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ You don't have permission to use this command. Admin only.", parse_mode=ParseMode.HTML)
+        return
+    
+    try:
+        options = ExportOptions.parse(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(
+            f"❌ {html.escape(str(e))}\n\n<code>Usage: /export [csv|ndjson] [gz] [status=active,muted] "
+            f"[since=YYYY-MM-DD] [until=YYYY-MM-DD]</code>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    # Capture the users on the event loop, write the file in a worker thread
+    path, count = await asyncio.to_thread(write_export, capture_all_users(), options)
+    try:
+        if os.path.getsize(path) > EXPORT_MAX_BYTES:
+            await update.message.reply_text(
+                f"❌ The export of {count} users is too large to send. Try <code>gz</code> or a filter.",
+                parse_mode=ParseMode.HTML
+            )
+            return
+        with open(path, "rb") as export_file:
+            await update.message.reply_document(
+                document=InputFile(export_file, filename=options.file_name),
+                caption=f"📤 {count} users",
+                read_timeout=60,
+                write_timeout=60
+            )
+    finally:
+        os.remove(path)
+
+
+async def slowest_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the slowest recently profiled updates (admin only)."""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ You don't have permission to use this command. Admin only.", parse_mode=ParseMode.HTML)
+        return
+    
+    if not profiling_enabled():
+        await update.message.reply_text(
+            "ℹ️ Profiling is disabled.\n\nSet <code>PROFILE_SAMPLE_EVERY</code> or <code>PROFILE_SLOW_MS</code> to enable it.",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    worst = get_worst_updates(10)
+    message = "<b>🐢 Slowest Recent Updates</b>\n\n"
+    if not worst:
+        message += "<i>No slow or profiled updates recorded yet.</i>"
+    for i, entry in enumerate(worst, 1):
+        message += f"{i}. <b>{entry['handler']}</b> ({entry['update_type']}) - <b>{entry['duration_ms']:.0f} ms</b>\n"
+        message += f"   Update: <code>{entry['update_id']}</code> | At: {entry['at'][:19]}\n"
+        if entry["profile"]:
+            message += f"   Profile: <code>{entry['profile']}</code>\n"
+    
+    await update.message.reply_text(message, parse_mode=ParseMode.HTML)
+
+
+async def trace_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show recent update traces, one trace's spans, or send all as NDJSON (admin only)."""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ You don't have permission to use this command. Admin only.", parse_mode=ParseMode.HTML)
+        return
+    
+    if TRACE_SAMPLE <= 0:
+        await update.message.reply_text(
+            "ℹ️ Tracing is disabled.\n\nSet <code>TRACE_SAMPLE</code> above 0 to enable it.",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    traces = get_traces()
+    if not traces:
+        await update.message.reply_text("<i>No traces recorded yet.</i>", parse_mode=ParseMode.HTML)
+        return
+    
+    if context.args and context.args[0].lower() == "dump":
+        data = await asyncio.to_thread(dump_traces, traces)
+        await update.message.reply_document(
+            document=InputFile(data, filename="traces.ndjson"),
+            caption=f"🧵 {len(traces)} traces"
+        )
+        return
+    
+    if context.args:
+        record = find_trace(context.args[0])
+        if record is None:
+            await update.message.reply_text(
+                f"❌ No recent trace named or with id <code>{html.escape(context.args[0])}</code>.",
+                parse_mode=ParseMode.HTML
+            )
+            return
+        await update.message.reply_text(
+            f"<b>🧵 {html.escape(record['name'])}</b> - <code>{record['trace_id'][:12]}</code> at {record['time'][:19]}\n"
+            f"<pre>{html.escape(format_trace(record))}</pre>",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    message = f"<b>🧵 Recent Traces</b> ({len(traces)})\n\n"
+    for entry in summarize(traces)[:TRACE_SUMMARY_LIMIT]:
+        message += f"<code>{html.escape(entry['name'])}</code> ×{entry['count']}\n"
+        message += f"   avg {entry['avg_ms']:.0f} ms | max <b>{entry['max_ms']:.0f} ms</b> <code>{entry['slowest'][:12]}</code>\n"
+    message += "\n<i>/trace &lt;name or id&gt; shows the spans, /trace dump sends all traces.</i>"
+    await update.message.reply_text(message, parse_mode=ParseMode.HTML)
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show active users and the most used commands (admin only)."""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ You don't have permission to use this command. Admin only.", parse_mode=ParseMode.HTML)
+        return
+    
+    analytics = get_analytics()
+    hourly = analytics.hourly_hits(24)
+    message = f"""<b>📈 Usage Statistics</b>
+
+<b>👥 Active Users:</b>
+• Today: <b>{analytics.active_users(1)}</b>
+• Last 7 days: <b>{analytics.active_users(7)}</b>
+• Last 30 days: <b>{analytics.active_users(30)}</b>
+
+<b>🔥 Top Routes (24h):</b>
+"""
+    top_routes = analytics.top_routes(24, 10)
+    if not top_routes:
+        message += "<i>No interactions recorded.</i>\n"
+    for route, hits in top_routes:
+        message += f"• <code>{html.escape(route)}</code> - <b>{hits}</b>\n"
+    
+    message += f"\n<b>⏱ Hits:</b> last hour <b>{hourly[-1][1]}</b>, last 24h <b>{sum(hits for _, hits in hourly)}</b>"
+    message += "\n\n<i>Unique user counts are estimates (about ±2%).</i>"
+    
+    await update.message.reply_text(message, parse_mode=ParseMode.HTML)
+
+
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Back up all users now (admin only)."""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ You don't have permission to use this command. Admin only.", parse_mode=ParseMode.HTML)
+        return
+    
+    try:
+        result = await take_backup()
+    except Exception as e:
+        logger.error(f"Backup failed: {e}")
+        await update.message.reply_text(f"❌ Backup failed.\n\n<code>{html.escape(str(e))}</code>", parse_mode=ParseMode.HTML)
+        return
+    
+    if result is None:
+        await update.message.reply_text("⏳ A backup is already running, try again in a moment.", parse_mode=ParseMode.HTML)
+        return
+    
+    path, size, count, elapsed = result
+    await update.message.reply_text(
+        f"✅ Backed up <b>{count}</b> users in <b>{elapsed:.1f} s</b>\n\n"
+        f"📁 <code>{html.escape(path)}</code> ({size / 1024:.0f} KB)\n"
+        f"🗂 {len(list_backups())} backups kept (up to {BACKUP_KEEP})",
+        parse_mode=ParseMode.HTML
+    )
+
+
+async def reload_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Reload config.py without restarting (admin only)."""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ You don't have permission to use this command. Admin only.", parse_mode=ParseMode.HTML)
+        return
+    
+    try:
+        elapsed = await reload_config()
+        await update.message.reply_text(f"✅ Config reloaded in <b>{elapsed * 1000:.1f} ms</b>.", parse_mode=ParseMode.HTML)
+    except ValueError as e:
+        logger.error(f"Config reload failed: {e}")
+        await update.message.reply_text(
+            f"❌ Reload failed, keeping the current config.\n\n<code>{html.escape(str(e))}</code>",
+            parse_mode=ParseMode.HTML
+        )
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle regular text messages."""
-    track_user_interaction(update)
     user_message = update.message.text
     
     # Create a quick reply keyboard
@@ -1597,10 +1999,194 @@ Use the buttons for quick actions!
     )
 
 
+async def answer_superseded(bot, updates) -> None:
+    """Stop the loading spinner of callbacks replaced by a later tap on the same message."""
+    for update in updates:
+        try:
+            await bot.answer_callback_query(update.callback_query.id, rate_limit_args=LANE_BULK)
+        except Exception:
+            pass  # most are too old to answer by now
+
+
+async def backlog_caught_up(update: BacklogDrained, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Report how long handling the startup backlog took."""
+    elapsed = perf_counter() - update.started
+    metrics.set_gauge("backlog_catch_up_seconds", elapsed)
+    logger.info(f"Caught up with {update.handled} pending updates in {elapsed:.1f} s")
+
+
+async def post_init(application: Application) -> None:
+    """Start background helpers once the event loop is running."""
+    # Open the user store before the first update (snapshot or JSON)
+    store = load_users()
+    logger.info(f"Loaded {len(store)} users in {store.load_seconds * 1000:.1f} ms")
+    logger.info(f"Last handled update: {store.updates.high_water}")
+    blocklist = store.blocklist
+    logger.info(f"Blocklist: {len(blocklist.blocked)} blocked, {len(blocklist.muted)} muted")
+    # Pack the /find index in the background so the first search doesn't wait for it
+    store.search_index.ensure_built(store.view)
+    application.bot_data["user_flusher"] = asyncio.get_running_loop().create_task(run_write_behind())
+    application.bot_data["archiver"] = asyncio.get_running_loop().create_task(run_archiver())
+    if BACKUP_INTERVAL > 0:
+        application.bot_data["backups"] = asyncio.get_running_loop().create_task(run_backups())
+    get_analytics()
+    application.bot_data["analytics_flusher"] = asyncio.get_running_loop().create_task(run_analytics_flush())
+    
+    if CONFIG_WATCH_INTERVAL > 0:
+        application.bot_data["config_watcher"] = asyncio.get_running_loop().create_task(watch_config())
+    
+    if BACKLOG_DRAIN:
+        # Queue the coalesced backlog ahead of polling, then a marker to time catching up
+        updates, superseded, started = await drain_backlog(application.bot)
+        metrics.inc("backlog_updates_total", len(updates), outcome="handled")
+        metrics.inc("backlog_updates_total", len(superseded), outcome="superseded")
+        for update in updates:
+            await application.update_queue.put(update)
+        await application.update_queue.put(BacklogDrained(started, len(updates), len(superseded)))
+        if superseded:
+            application.bot_data["superseded_answers"] = asyncio.get_running_loop().create_task(
+                answer_superseded(application.bot, superseded)
+            )
+    
+    if WATCHDOG_STALL_MS > 0:
+        watchdog = LoopWatchdog()
+        watchdog.start()
+        application.bot_data["watchdog"] = watchdog
+    
+    # Finish what the previous process left on screen, and stop gracefully from now on
+    saved = get_inflight().take_saved()
+    if saved:
+        application.bot_data["inflight_resume"] = asyncio.get_running_loop().create_task(
+            resume_inflight(application.bot, saved)
+        )
+    install_stop_handler(force_shutdown)
+    application.bot_data["status_writer"] = asyncio.get_running_loop().create_task(run_status_writer(worker_status))
+    application.bot_data["overload_monitor"] = asyncio.get_running_loop().create_task(
+        run_overload_monitor(application.update_queue, outgoing_waits=lambda: {
+            lane: wait_ms for lane, wait_ms in application.bot.rate_limiter.scheduler.oldest_waits_ms().items()
+            if lane in OVERLOAD_LANES
+        })
+    )
+    
+    ready_seconds = perf_counter() - STARTED_AT
+    metrics.set_gauge("startup_seconds", ready_seconds)
+    if ready_seconds > STARTUP_BUDGET:
+        logger.warning(f"Ready after {ready_seconds:.1f} s, over the {STARTUP_BUDGET:.0f} s startup budget")
+    else:
+        logger.info(f"Ready after {ready_seconds:.1f} s")
+
+
+def worker_status(ready: bool = True) -> dict:
+    """Collect the status web.py reports for this worker."""
+    return {
+        "pid": os.getpid(),
+        "updated": datetime.now().timestamp(),
+        "ready": ready and not is_stopping(),
+        "stopping": is_stopping(),
+        "users": len(get_store()),
+        "metrics": metrics.render_text()
+    }
+
+
+def save_state() -> None:
+    """Apply deferred tracking, then write users, the archive index, analytics and unfinished flows."""
+    get_overload().drain()
+    get_store().flush()
+    archive = get_archive()
+    if archive.dirty:
+        archive.save_index(None, durable_restores())
+    get_analytics().save()
+    get_inflight().save()
+
+
+def force_shutdown() -> None:
+    """Save state and exit when shutting down runs past the deadline."""
+    logger.warning(f"Shutdown did not finish within {SHUTDOWN_DEADLINE:.0f} s, saving state and exiting")
+    try:
+        save_state()
+    except Exception as e:
+        logger.error(f"Error saving state: {e}")
+    stop_tracing()
+    stop_logging()
+    os._exit(0)
+
+
+async def post_shutdown(application: Application) -> None:
+    """Stop background helpers and save state."""
+    flusher = application.bot_data.pop("user_flusher", None)
+    if flusher:
+        flusher.cancel()
+    
+    inflight_resume = application.bot_data.pop("inflight_resume", None)
+    if inflight_resume:
+        inflight_resume.cancel()
+    
+    superseded_answers = application.bot_data.pop("superseded_answers", None)
+    if superseded_answers:
+        superseded_answers.cancel()
+    
+    archiver = application.bot_data.pop("archiver", None)
+    if archiver:
+        archiver.cancel()
+    
+    backups = application.bot_data.pop("backups", None)
+    if backups:
+        backups.cancel()
+    
+    analytics_flusher = application.bot_data.pop("analytics_flusher", None)
+    if analytics_flusher:
+        analytics_flusher.cancel()
+    
+    config_watcher = application.bot_data.pop("config_watcher", None)
+    if config_watcher:
+        config_watcher.cancel()
+    
+    watchdog = application.bot_data.pop("watchdog", None)
+    if watchdog:
+        watchdog.stop()
+    
+    status_writer = application.bot_data.pop("status_writer", None)
+    if status_writer:
+        status_writer.cancel()
+    
+    overload_monitor = application.bot_data.pop("overload_monitor", None)
+    if overload_monitor:
+        overload_monitor.cancel()
+    
+    save_state()
+    write_status(worker_status(ready=False))
+    elapsed = stopping_for()
+    if elapsed is not None:
+        metrics.set_gauge("shutdown_seconds", elapsed)
+        logger.info(f"Shut down in {elapsed:.1f} s")
+
+
 def main() -> None:
     """Start the bot."""
+    # Compile config.py content up front so invalid content fails at startup
+    load_config()
+    
     # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .application_class(TracedApplication)
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_BASE_URL)
+        .update_queue(TimedUpdateQueue(get_overload().sample))
+        .request(build_api_request())
+        .get_updates_request(build_updates_request())
+        .rate_limiter(OutgoingGate(on_wait=sample_outgoing_wait))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # Register pre-dispatch gates
+    application.add_handler(TypeHandler(Update, duplicate_update_gate), group=GATE_GROUP_DUPLICATES)
+    application.add_handler(TypeHandler(Update, blocklist_gate), group=GATE_GROUP_BLOCKLIST)
+    application.add_handler(TypeHandler(Update, rate_limit_gate), group=GATE_GROUP_RATE_LIMIT)
+    application.add_handler(TypeHandler(Update, analytics_gate), group=GATE_GROUP_ANALYTICS)
+    application.add_handler(TypeHandler(Update, tracking_gate), group=GATE_GROUP_TRACKING)
 
     # Register handlers
     application.add_handler(CommandHandler("start", start))
@@ -1622,12 +2208,25 @@ def main() -> None:
     application.add_handler(CommandHandler("unmute", unmute_user_command))
     application.add_handler(CommandHandler("delete_user", delete_user_command))
     application.add_handler(CommandHandler("block", block_user_command))
+    application.add_handler(CommandHandler("slowest", slowest_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("trace", trace_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("find", find_command))
+    application.add_handler(CommandHandler("backup", backup_command))
+    application.add_handler(CommandHandler("reload", reload_command))
     application.add_handler(CommandHandler("echo", echo))
     application.add_handler(CommandHandler("style", style_demo))
     application.add_handler(CommandHandler("buttons", buttons_demo))
     application.add_handler(CallbackQueryHandler(button_callback))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
+    application.add_handler(TypeHandler(BacklogDrained, backlog_caught_up))
+
+    # Wrap every registered callback so slow updates can be profiled
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = instrumented(handler.callback)
 
     # Start the bot
     logger.info("Bot is starting...")
@@ -0,0 +1,86 @@
+"""
+Config loader module for reloading config.py without restarting the bot.
+"""
+import asyncio
+import logging
+import os
+import runpy
+from time import perf_counter
+from typing import Optional, Tuple
+
+from templates import CompiledConfig, compile_templates, set_templates
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = os.getenv("CONFIG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.py"))
+# Seconds between checks of CONFIG_FILE for changes (0 disables watching)
+CONFIG_WATCH_INTERVAL = float(os.getenv("CONFIG_WATCH_INTERVAL", "2"))
+
+_loaded_stat: Optional[Tuple[int, int]] = None
+
+
+def _file_stat(path: str) -> Optional[Tuple[int, int]]:
+    """Get (mtime_ns, size) of a file, or None if it's missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def compile_config_file(path: str = CONFIG_FILE) -> CompiledConfig:
+    """Run a config file and compile its content, raising ValueError if it's invalid."""
+    try:
+        namespace = runpy.run_path(path)
+    except Exception as e:
+        raise ValueError(f"Could not load {path}: {e}")
+
+    bot_config = namespace.get("BOT_CONFIG")
+    custom_messages = namespace.get("CUSTOM_MESSAGES", {})
+    if not isinstance(bot_config, dict) or not isinstance(custom_messages, dict):
+        raise ValueError(f"{path} must define BOT_CONFIG and CUSTOM_MESSAGES as dicts")
+    try:
+        return compile_templates(bot_config, custom_messages)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid config in {path}: {e!r}")
+
+
+def load_config(path: str = CONFIG_FILE) -> None:
+    """Compile the config file and make it current, raising ValueError if it's invalid."""
+    global _loaded_stat
+    stat = _file_stat(path)
+    set_templates(compile_config_file(path))
+    _loaded_stat = stat
+
+
+async def reload_config(path: str = CONFIG_FILE) -> float:
+    """Recompile the config file off the event loop and swap it in.
+
+    Returns the time taken in seconds. Raises ValueError and keeps the
+    current config if the new one is invalid.
+    """
+    global _loaded_stat
+    start = perf_counter()
+    stat = _file_stat(path)
+    compiled = await asyncio.to_thread(compile_config_file, path)
+    set_templates(compiled)
+    _loaded_stat = stat
+    elapsed = perf_counter() - start
+    logger.info(f"Reloaded {path} in {elapsed * 1000:.1f} ms")
+    return elapsed
+
+
+async def watch_config(path: str = CONFIG_FILE, interval: float = CONFIG_WATCH_INTERVAL) -> None:
+    """Reload the config whenever the file changes."""
+    global _loaded_stat
+    while True:
+        await asyncio.sleep(interval)
+        stat = _file_stat(path)
+        if stat is None or stat == _loaded_stat:
+            continue
+        try:
+            await reload_config(path)
+        except ValueError as e:
+            # Don't retry until the file changes again
+            _loaded_stat = stat
+            logger.error(f"Config reload failed, keeping the current config: {e}")
@@ -0,0 +1,103 @@
+"""
+HTTP client configuration for Bot API requests, read from the environment.
+
+API calls and getUpdates long polling use separate request objects, so a
+burst of replies can never starve polling of a connection (or the reverse).
+
+BOT_API_BASE_URL points the bot at another Bot API server (for example a
+local one); it's the URL the token is appended to.
+
+Settings (prefix BOT_HTTP_ for API calls, BOT_UPDATES_HTTP_ for getUpdates):
+    POOL_SIZE          maximum open connections
+    KEEPALIVE          idle connections kept open for reuse
+    KEEPALIVE_EXPIRY   seconds an idle connection is kept
+    CONNECT_TIMEOUT, READ_TIMEOUT, WRITE_TIMEOUT, POOL_TIMEOUT   seconds
+    HTTP_VERSION       "1.1" or "2" (needs python-telegram-bot[http2])
+"""
+import logging
+import os
+from typing import Dict
+
+import httpx
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Bot API endpoint, followed by the token
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "https://api.telegram.org/bot")
+
+API_DEFAULTS = {
+    "POOL_SIZE": "256",
+    "KEEPALIVE": "64",
+    "KEEPALIVE_EXPIRY": "30",
+    "CONNECT_TIMEOUT": "5",
+    "READ_TIMEOUT": "10",
+    "WRITE_TIMEOUT": "10",
+    "POOL_TIMEOUT": "5",
+    "HTTP_VERSION": "1.1"
+}
+
+# One long-polling connection (the poll timeout is added to READ_TIMEOUT)
+UPDATES_DEFAULTS = {
+    "POOL_SIZE": "1",
+    "KEEPALIVE": "1",
+    "KEEPALIVE_EXPIRY": "60",
+    "CONNECT_TIMEOUT": "5",
+    "READ_TIMEOUT": "5",
+    "WRITE_TIMEOUT": "5",
+    "POOL_TIMEOUT": "5",
+    "HTTP_VERSION": "1.1"
+}
+
+
+def read_settings(prefix: str, defaults: Dict[str, str]) -> Dict:
+    """Read HTTP settings with the given environment prefix."""
+    def value(name: str) -> str:
+        return os.getenv(f"{prefix}{name}", defaults[name])
+
+    return {
+        "pool_size": int(value("POOL_SIZE")),
+        "keepalive": int(value("KEEPALIVE")),
+        "keepalive_expiry": float(value("KEEPALIVE_EXPIRY")),
+        "connect_timeout": float(value("CONNECT_TIMEOUT")),
+        "read_timeout": float(value("READ_TIMEOUT")),
+        "write_timeout": float(value("WRITE_TIMEOUT")),
+        "pool_timeout": float(value("POOL_TIMEOUT")),
+        "http_version": value("HTTP_VERSION")
+    }
+
+
+def build_request(settings: Dict) -> HTTPXRequest:
+    """Build a request object from settings."""
+    http_version = settings["http_version"]
+    if http_version != "1.1":
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 needs python-telegram-bot[http2], using HTTP/1.1")
+            http_version = "1.1"
+
+    limits = httpx.Limits(
+        max_connections=settings["pool_size"],
+        max_keepalive_connections=min(settings["keepalive"], settings["pool_size"]),
+        keepalive_expiry=settings["keepalive_expiry"]
+    )
+    return HTTPXRequest(
+        connection_pool_size=settings["pool_size"],
+        connect_timeout=settings["connect_timeout"],
+        read_timeout=settings["read_timeout"],
+        write_timeout=settings["write_timeout"],
+        pool_timeout=settings["pool_timeout"],
+        http_version=http_version,
+        httpx_kwargs={"limits": limits}
+    )
+
+
+def build_api_request() -> HTTPXRequest:
+    """Request object for regular Bot API calls."""
+    return build_request(read_settings("BOT_HTTP_", API_DEFAULTS))
+
+
+def build_updates_request() -> HTTPXRequest:
+    """Request object for getUpdates long polling."""
+    return build_request(read_settings("BOT_UPDATES_HTTP_", UPDATES_DEFAULTS))
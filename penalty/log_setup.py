@@ -0,0 +1,126 @@
+"""
+Logging setup module: queue-based handlers with per-update context fields.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" or "json" (one JSON object per line)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Fraction of DEBUG records that are kept (1.0 keeps all of them)
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", "1.0"))
+
+CONTEXT_FIELDS = ("update_id", "user_id", "handler", "duration_ms")
+
+_update_context: contextvars.ContextVar[Dict] = contextvars.ContextVar("update_context", default={})
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_update_context(**fields) -> contextvars.Token:
+    """Attach fields to every record logged in the current context."""
+    context = dict(_update_context.get())
+    context.update(fields)
+    return _update_context.set(context)
+
+
+def reset_update_context(token: contextvars.Token) -> None:
+    """Restore the context from before bind_update_context."""
+    _update_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the per-update context onto records and sample DEBUG records."""
+
+    def __init__(self, debug_sample: float = 1.0):
+        super().__init__()
+        self.debug_sample = debug_sample
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and self.debug_sample < 1.0:
+            if random.random() >= self.debug_sample:
+                return False
+
+        context = _update_context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """Classic text format with the context fields appended when set."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        context = [f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS
+                   if getattr(record, field, None) is not None]
+        if context:
+            text += f" [{' '.join(context)}]"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT,
+                  debug_sample: float = LOG_DEBUG_SAMPLE) -> None:
+    """Route all logging through a queue so formatting and I/O happen off-loop.
+
+    Calling it again after logging was set up does nothing.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter(debug_sample))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
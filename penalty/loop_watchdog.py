@@ -0,0 +1,80 @@
+"""
+Watchdog module for detecting code that blocks the asyncio event loop.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import traceback
+from time import monotonic
+from typing import Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often the event loop reports that it is alive
+WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", "0.1"))
+# Lag after which the loop counts as stalled (0 disables the watchdog)
+WATCHDOG_STALL_MS = float(os.getenv("WATCHDOG_STALL_MS", "500"))
+
+
+class LoopWatchdog:
+    """Heartbeat on the event loop, checked from a separate thread.
+
+    When the heartbeat is late by more than WATCHDOG_STALL_MS, the stack of
+    the event loop thread is logged once for that stall.
+    """
+
+    def __init__(self, interval: float = WATCHDOG_INTERVAL, stall_ms: float = WATCHDOG_STALL_MS):
+        self.interval = interval
+        self.stall_seconds = stall_ms / 1000
+        self._last_beat = monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start the heartbeat on the running loop and the checker thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = monotonic()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the heartbeat and the checker thread."""
+        self._stopped.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+
+    async def _heartbeat(self) -> None:
+        """Record a beat every interval and the lag of each wakeup."""
+        while True:
+            expected = monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = monotonic()
+            self._last_beat = now
+            metrics.set_gauge("event_loop_lag_seconds", max(0.0, now - expected))
+
+    def _watch(self) -> None:
+        """Check the heartbeat and report stalls with the loop thread's stack."""
+        stalled_since = None
+        while not self._stopped.wait(self.interval / 2):
+            lag = monotonic() - self._last_beat
+            if lag < self.stall_seconds:
+                if stalled_since is not None:
+                    stall_duration = monotonic() - stalled_since
+                    metrics.observe("event_loop_stall_seconds", stall_duration)
+                    logger.warning(f"Event loop recovered after a {stall_duration * 1000:.0f} ms stall")
+                    stalled_since = None
+                continue
+
+            if stalled_since is None:
+                stalled_since = self._last_beat
+                metrics.inc("event_loop_stalls_total")
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else "<stack unavailable>\n"
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms, loop thread stack:\n{stack}")
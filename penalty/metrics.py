@@ -0,0 +1,74 @@
+"""
+Metrics module for in-process counters, gauges and timings.
+"""
+import threading
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+
+
+def _key(name: str, labels: Dict) -> str:
+    """Build a metric key like name{label="value"}."""
+    if not labels:
+        return name
+    label_text = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{label_text}}}"
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """Increment a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set a gauge to the given value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def clear_gauges(name: str) -> None:
+    """Remove a gauge with all its label sets, e.g. before setting the ones that still apply."""
+    with _lock:
+        for key in [key for key in _gauges if key == name or key.startswith(name + "{")]:
+            del _gauges[key]
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record a timing (or any other sample) as count, sum and max."""
+    key = _key(name, labels)
+    with _lock:
+        timing = _timings.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["sum"] += value
+        timing["max"] = max(timing["max"], value)
+
+
+def get_metrics() -> Dict[str, Dict]:
+    """Get a copy of all metrics."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {key: dict(timing) for key, timing in _timings.items()}
+        }
+
+
+def render_text() -> str:
+    """Render all metrics in the Prometheus text format."""
+    metrics = get_metrics()
+    lines = []
+    for key, value in sorted(metrics["counters"].items()):
+        lines.append(f"{key} {value}")
+    for key, value in sorted(metrics["gauges"].items()):
+        lines.append(f"{key} {value}")
+    for key, timing in sorted(metrics["timings"].items()):
+        name, _, labels = key.partition("{")
+        labels = "{" + labels if labels else ""
+        for suffix in ("count", "sum", "max"):
+            lines.append(f"{name}_{suffix}{labels} {timing[suffix]}")
+    return "\n".join(lines) + "\n"
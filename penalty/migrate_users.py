@@ -0,0 +1,266 @@
+"""Migrate users_data.json to the current user record schema.
+
+The file is read with an incremental parser and written record by
+record, so memory stays flat for any file size. Progress is printed
+while it runs, and a checkpoint file lets an interrupted migration
+resume where it stopped. At the end the output is read back and its
+per-status counts are checked against the input before anything is
+replaced.
+
+Stop the bot before migrating in place.
+
+Usage: python migrate_users.py [input] [--output PATH] [--in-place] [--restart]
+"""
+import argparse
+import codecs
+import json
+import os
+import sys
+from collections import Counter
+from time import monotonic
+from typing import Dict, Iterator, Optional, Tuple
+
+from user_schema import SCHEMA_VERSION, record_version, upgrade
+from user_tracker import USER_DATA_FILE, STATUS_ACTIVE
+
+CHUNK_SIZE = 1024 * 1024
+# Records between checkpoints
+CHECKPOINT_EVERY = 10000
+PROGRESS_SECONDS = 2.0
+
+WHITESPACE = " \t\r\n"
+
+
+class StreamingObjectReader:
+    """Reads the (key, value) pairs of a top-level JSON object without loading it whole."""
+
+    def __init__(self, f, offset: int = 0):
+        """Read from a binary file; a non-zero offset must be just after a value."""
+        self._file = f
+        self._file.seek(offset)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self.offset = offset  # bytes consumed
+        self._started = offset > 0
+
+    def _fill(self) -> None:
+        data = self._file.read(CHUNK_SIZE)
+        self._eof = not data
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(data, final=self._eof)
+        self._pos = 0
+
+    def _advance(self, end: int) -> None:
+        self.offset += len(self._buffer[self._pos:end].encode("utf-8"))
+        self._pos = end
+
+    def _peek(self) -> str:
+        """Skip whitespace and get the next character, or "" at the end of the file."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._advance(self._pos + 1)
+            if self._pos < len(self._buffer) or self._eof:
+                return self._buffer[self._pos] if self._pos < len(self._buffer) else ""
+            self._fill()
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} at byte {self.offset}, found {found or 'end of file'!r}")
+        self._advance(self._pos + 1)
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            if end == len(self._buffer) and not self._eof:
+                self._fill()  # a number could continue in the next chunk
+                continue
+            self._advance(end)
+            return value
+
+    def __iter__(self) -> Iterator[Tuple[str, object]]:
+        if not self._started:
+            self._expect("{")
+            if self._peek() == "}":
+                return
+            self._started = True
+        else:
+            if self._peek() == "}":
+                return
+            self._expect(",")
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected a key at byte {self.offset}")
+            self._expect(":")
+            yield key, self._value()
+            if self._peek() == "}":
+                return
+            self._expect(",")
+
+
+def _record_json(key: str, user: Dict, first: bool) -> bytes:
+    """Format one record the way user_tracker writes users_data.json."""
+    text = ("{\n  " if first else ",\n  ") + json.dumps(key, ensure_ascii=False) + ": "
+    text += json.dumps(user, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+    return text.encode("utf-8")
+
+
+def status_key(user) -> str:
+    """Get the status a record is counted under, the way upgrade() fills it in.
+
+    Missing and null mean active. Keys are strings so the counts survive
+    the JSON checkpoint unchanged.
+    """
+    if not isinstance(user, dict):
+        return "(not an object)"
+    status = user.get("status")
+    if status is None:
+        return STATUS_ACTIVE
+    return status if isinstance(status, str) else json.dumps(status)
+
+
+def count_statuses(path: str) -> Counter:
+    """Count the users in a users JSON file per status, streaming."""
+    counts = Counter()
+    with open(path, "rb") as f:
+        for _, user in StreamingObjectReader(f):
+            counts[status_key(user)] += 1
+    return counts
+
+
+class Checkpoint:
+    """Where an interrupted migration stopped, saved next to the output."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, input_path: str) -> Optional[Dict]:
+        """Read the checkpoint if it belongs to the current input file."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(input_path)
+        if (state.get("input_size"), state.get("input_mtime_ns")) != (stat.st_size, stat.st_mtime_ns):
+            print("Input changed since the checkpoint, starting over", file=sys.stderr)
+            return None
+        return state
+
+    def save(self, state: Dict) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def migrate(input_path: str, output_path: str, restart: bool = False) -> Counter:
+    """Write upgraded records from input_path to output_path. Returns the input counts per status."""
+    checkpoint = Checkpoint(output_path + ".checkpoint")
+    stat = os.stat(input_path)
+    state = None if restart else checkpoint.load(input_path)
+    if state is None:
+        state = {
+            "input_size": stat.st_size,
+            "input_mtime_ns": stat.st_mtime_ns,
+            "in_offset": 0,
+            "out_offset": 0,
+            "records": 0,
+            "statuses": {},
+            "versions": {}
+        }
+    else:
+        print(f"Resuming after {state['records']} users", file=sys.stderr)
+
+    statuses = Counter(state["statuses"])
+    versions = Counter(state["versions"])
+    records = resumed = state["records"]
+    started = monotonic()
+    last_report = started
+
+    with open(input_path, "rb") as source, open(output_path, "r+b" if state["out_offset"] else "wb") as out:
+        out.truncate(state["out_offset"])
+        out.seek(state["out_offset"])
+        reader = StreamingObjectReader(source, state["in_offset"])
+        for key, user in reader:
+            if not isinstance(user, dict):
+                raise ValueError(f"User {key!r} is not an object")
+            statuses[status_key(user)] += 1
+            versions[str(record_version(user))] += 1
+            out.write(_record_json(key, upgrade(user), first=records == 0))
+            records += 1
+
+            if records % CHECKPOINT_EVERY == 0:
+                out.flush()
+                os.fsync(out.fileno())
+                state.update(in_offset=reader.offset, out_offset=out.tell(), records=records,
+                             statuses=statuses, versions=versions)
+                checkpoint.save(state)
+
+            now = monotonic()
+            if now - last_report >= PROGRESS_SECONDS:
+                last_report = now
+                rate = (records - resumed) / max(now - started, 1e-9)
+                print(f"{reader.offset / max(stat.st_size, 1):6.1%}  {records} users  "
+                      f"{reader.offset / 1e6:.0f} MB  {rate:.0f} users/s", file=sys.stderr)
+
+        out.write(b"{}" if records == 0 else b"\n}")
+        out.flush()
+        os.fsync(out.fileno())
+
+    checkpoint.remove()
+    print(f"Migrated {records} users in {monotonic() - started:.1f} s "
+          f"(schema versions in: {dict(versions)}, out: {SCHEMA_VERSION})", file=sys.stderr)
+    return statuses
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Migrate users_data.json to the current record schema.")
+    parser.add_argument("input", nargs="?", default=USER_DATA_FILE)
+    parser.add_argument("--output", help="output file (default: <input>.migrated)")
+    parser.add_argument("--in-place", action="store_true",
+                        help="replace the input once verified, keeping it as <input>.bak")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    output_path = args.output or args.input + ".migrated"
+    expected = migrate(args.input, output_path, args.restart)
+
+    print("Verifying...", file=sys.stderr)
+    found = count_statuses(output_path)
+    for status in sorted(set(expected) | set(found)):
+        mark = "ok" if expected[status] == found[status] else "MISMATCH"
+        print(f"  {status}: {expected[status]} -> {found[status]}  {mark}", file=sys.stderr)
+    if expected != found:
+        print(f"Verification failed, {args.input} was not changed", file=sys.stderr)
+        return 1
+
+    if args.in_place:
+        os.replace(args.input, args.input + ".bak")
+        os.replace(output_path, args.input)
+        print(f"Replaced {args.input} (previous version in {args.input}.bak)", file=sys.stderr)
+    else:
+        print(f"Wrote {output_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,364 @@
+"""
+Outgoing request module: a layer around every Bot API call made by the bot.
+
+It is plugged in as the bot's rate limiter, which python-telegram-bot calls
+for every request except getUpdates. Requests are scheduled in priority
+lanes that share a global and a per-chat rate budget, so broadcasts and
+loading animations never hold up replies to users.
+"""
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import os
+from collections import OrderedDict, deque
+from datetime import timedelta
+from time import monotonic
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import metrics
+import tracing
+
+# Number of messages whose last content is remembered
+EDIT_CACHE_SIZE = int(os.getenv("EDIT_CACHE_SIZE", "5000"))
+# Requests per second across all chats, and how many may go out at once
+OUTGOING_GLOBAL_RATE = float(os.getenv("OUTGOING_GLOBAL_RATE", "30"))
+OUTGOING_GLOBAL_BURST = float(os.getenv("OUTGOING_GLOBAL_BURST", "30"))
+# Requests per second to one chat, and how many may go out at once
+OUTGOING_CHAT_RATE = float(os.getenv("OUTGOING_CHAT_RATE", "1"))
+OUTGOING_CHAT_BURST = float(os.getenv("OUTGOING_CHAT_BURST", "5"))
+# Number of chats whose budget is remembered
+OUTGOING_MAX_CHATS = int(os.getenv("OUTGOING_MAX_CHATS", "10000"))
+# Retries after Telegram answers with RetryAfter
+OUTGOING_MAX_RETRIES = int(os.getenv("OUTGOING_MAX_RETRIES", "1"))
+
+# Lanes, highest priority first
+LANE_INTERACTIVE = "interactive"
+LANE_CALLBACK = "callback"
+LANE_ANIMATION = "animation"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_CALLBACK, LANE_ANIMATION, LANE_BULK)
+
+_current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("outgoing_lane", default=LANE_INTERACTIVE)
+
+
+@contextlib.contextmanager
+def outgoing_lane(lane: str):
+    """Send the requests made inside the block through the given lane."""
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class TokenBucket:
+    """Allows rate requests per second with bursts of up to burst."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+
+    def _refill(self, now: float) -> None:
+        # now may predate a bucket created just after it was taken
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class OutgoingScheduler:
+    """Grants requests their turn by lane priority within the rate budgets."""
+
+    def __init__(self, global_rate: float = OUTGOING_GLOBAL_RATE, global_burst: float = OUTGOING_GLOBAL_BURST,
+                 chat_rate: float = OUTGOING_CHAT_RATE, chat_burst: float = OUTGOING_CHAT_BURST,
+                 max_chats: int = OUTGOING_MAX_CHATS, on_wait: Optional[Callable[[str, float], None]] = None):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: OrderedDict = OrderedDict()  # chat_id -> TokenBucket
+        self._lanes = {lane: deque() for lane in LANES}  # lane -> (chat_id, future, enqueued at)
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.on_wait = on_wait  # called with (lane, ms waited) for every request granted
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        self._chats[chat_id] = bucket
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+        return bucket
+
+    def _wait_time(self, chat_id, now: float) -> float:
+        """Seconds until a request to chat_id fits in the budgets."""
+        wait = max(self._paused_until - now, self._global.wait_time(now))
+        if chat_id is not None:
+            wait = max(wait, self._chat_bucket(chat_id).wait_time(now))
+        return wait
+
+    def _grant(self, lane: str, chat_id, enqueued: float, now: float) -> None:
+        self._global.take()
+        if chat_id is not None:
+            self._chat_bucket(chat_id).take()
+        metrics.observe("outgoing_wait_seconds", now - enqueued, lane=lane)
+        if self.on_wait is not None:
+            self.on_wait(lane, (now - enqueued) * 1000)
+
+    def oldest_waits_ms(self) -> Dict[str, float]:
+        """How long the first request still waiting in each lane has been waiting (0 if none is)."""
+        now = monotonic()
+        oldest = {}
+        for lane, waiting in self._lanes.items():
+            enqueued = min((entry[2] for entry in waiting if not entry[1].done()), default=now)
+            oldest[lane] = (now - enqueued) * 1000
+        return oldest
+
+    def _report_depth(self) -> None:
+        for lane, waiting in self._lanes.items():
+            metrics.set_gauge("outgoing_queue_depth", len(waiting), lane=lane)
+
+    async def acquire(self, lane: str, chat_id=None) -> None:
+        """Wait until a request in the given lane may be sent."""
+        now = monotonic()
+        higher_waiting = any(self._lanes[other] for other in LANES[:LANES.index(lane) + 1])
+        if not higher_waiting and self._wait_time(chat_id, now) == 0:
+            self._grant(lane, chat_id, now, now)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[lane].append((chat_id, future, now))
+        self._report_depth()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            with contextlib.suppress(ValueError):
+                self._lanes[lane].remove((chat_id, future, now))
+            raise
+
+    def pause(self, seconds: float) -> None:
+        """Hold all requests, e.g. after Telegram answered with RetryAfter."""
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+
+    async def _dispatch(self) -> None:
+        """Hand out turns to queued requests, highest lane first.
+
+        A request waiting on its own chat's budget does not hold up the
+        ones behind it: each lane is scanned for the first request that
+        fits. Requests to the same chat still go out in order.
+        """
+        while any(self._lanes.values()):
+            self._wakeup.clear()
+            now = monotonic()
+            next_wait = max(self._paused_until - now, self._global.wait_time(now))
+            if next_wait == 0:
+                next_wait = None
+                chat_waits = {}  # chat_id -> wait, computed once per pass
+                for lane in LANES:
+                    waiting = self._lanes[lane]
+                    ready = None
+                    for entry in waiting:
+                        chat_id, future, enqueued = entry
+                        if future.done():
+                            continue  # cancelled while queued
+                        wait = chat_waits.get(chat_id)
+                        if wait is None:
+                            wait = chat_waits[chat_id] = self._wait_time(chat_id, now)
+                        if wait == 0:
+                            ready = entry
+                            break
+                        next_wait = wait if next_wait is None else min(next_wait, wait)
+                    if ready is not None:
+                        waiting.remove(ready)
+                        chat_id, future, enqueued = ready
+                        self._grant(lane, chat_id, enqueued, now)
+                        future.set_result(None)
+                        next_wait = 0
+                        break
+            self._report_depth()
+            if next_wait:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), next_wait)
+            else:
+                await asyncio.sleep(0)
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+
+
+EDIT_ENDPOINTS = ("editMessageText", "editMessageCaption", "editMessageReplyMarkup")
+TEXT_FIELDS = ("parse_mode", "entities", "caption_entities", "link_preview_options", "show_caption_above_media")
+
+
+def _digest(*parts) -> bytes:
+    """Hash message content; repr covers the fields of Telegram objects."""
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).digest()
+
+
+class EditCache:
+    """Hashes of the last text and markup of recent messages, LRU-bounded."""
+
+    def __init__(self, max_size: int = EDIT_CACHE_SIZE):
+        self.max_size = max_size
+        self._messages: OrderedDict = OrderedDict()  # message key -> (text hash, markup hash)
+
+    @staticmethod
+    def _message_key(data: Dict) -> Optional[Tuple]:
+        if data.get("inline_message_id"):
+            return ("inline", data["inline_message_id"])
+        if data.get("chat_id") is not None and data.get("message_id") is not None:
+            return (data["chat_id"], data["message_id"])
+        return None
+
+    @staticmethod
+    def _content(endpoint: str, data: Dict) -> Tuple[Optional[bytes], bytes]:
+        """Get (text hash, markup hash) for a request; text hash is None if untouched."""
+        markup_hash = _digest(data.get("reply_markup"))
+        if endpoint == "editMessageReplyMarkup":
+            return None, markup_hash
+        text = data.get("caption") if endpoint == "editMessageCaption" else data.get("text")
+        return _digest(text, *(data.get(field) for field in TEXT_FIELDS)), markup_hash
+
+    def _store(self, key: Tuple, text_hash: Optional[bytes], markup_hash: bytes) -> None:
+        if text_hash is None:
+            previous = self._messages.get(key)
+            if previous is None:
+                return  # text unknown, nothing useful to remember
+            text_hash = previous[0]
+        self._messages[key] = (text_hash, markup_hash)
+        self._messages.move_to_end(key)
+        while len(self._messages) > self.max_size:
+            self._messages.popitem(last=False)
+
+    def is_redundant(self, endpoint: str, data: Dict) -> bool:
+        """Check if an edit would leave the message exactly as it is."""
+        if endpoint not in EDIT_ENDPOINTS:
+            return False
+        key = self._message_key(data)
+        current = self._messages.get(key) if key else None
+        if current is None:
+            return False
+        text_hash, markup_hash = self._content(endpoint, data)
+        return markup_hash == current[1] and (text_hash is None or text_hash == current[0])
+
+    def record(self, endpoint: str, data: Dict, result: Any) -> None:
+        """Remember the content of a sent or edited message."""
+        if endpoint == "sendMessage" and isinstance(result, dict):
+            key = (data.get("chat_id"), result.get("message_id"))
+            self._store(key, *self._content(endpoint, data))
+        elif endpoint in EDIT_ENDPOINTS:
+            key = self._message_key(data)
+            if key:
+                self._store(key, *self._content(endpoint, data))
+        elif endpoint == "deleteMessage":
+            self.forget(data)
+
+    def forget(self, data: Dict) -> None:
+        """Drop what is known about a message."""
+        key = self._message_key(data)
+        if key:
+            self._messages.pop(key, None)
+
+
+class OutgoingGate(BaseRateLimiter):
+    """Skips edits that would not change the message, then schedules the request.
+
+    The lane is rate_limit_args if it names a lane, LANE_CALLBACK for
+    callback answers, and otherwise the lane set with outgoing_lane().
+    """
+
+    def __init__(self, edit_cache_size: int = EDIT_CACHE_SIZE, max_retries: int = OUTGOING_MAX_RETRIES,
+                 on_wait: Optional[Callable[[str, float], None]] = None):
+        self.edits = EditCache(edit_cache_size)
+        self.max_retries = max_retries
+        self.on_wait = on_wait
+        self.scheduler: Optional[OutgoingScheduler] = None
+
+    async def initialize(self) -> None:
+        self.scheduler = OutgoingScheduler(on_wait=self.on_wait)
+
+    async def shutdown(self) -> None:
+        if self.scheduler is not None:
+            await self.scheduler.close()
+
+    @staticmethod
+    def _lane(endpoint: str, rate_limit_args) -> str:
+        if rate_limit_args in LANES:
+            return rate_limit_args
+        if endpoint == "answerCallbackQuery":
+            return LANE_CALLBACK
+        return _current_lane.get()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        with tracing.span(f"api.{endpoint}") as api_span:
+            return await self._send(callback, args, kwargs, endpoint, data, rate_limit_args, api_span)
+
+    async def _send(self, callback, args, kwargs, endpoint, data, rate_limit_args, api_span):
+        if self.edits.is_redundant(endpoint, data):
+            metrics.inc("edits_skipped_total", endpoint=endpoint)
+            if api_span is not None:
+                api_span.set(skipped="unchanged")
+            # Bot methods return True as-is instead of a Message (as for inline edits)
+            return True
+
+        if self.scheduler is None:
+            self.scheduler = OutgoingScheduler(on_wait=self.on_wait)
+        lane = self._lane(endpoint, rate_limit_args)
+        chat_id = data.get("chat_id")
+        retries = 0
+        waited = 0.0
+        try:
+            while True:
+                wait_start = monotonic()
+                await self.scheduler.acquire(lane, chat_id)
+                waited += monotonic() - wait_start
+                try:
+                    result = await callback(*args, **kwargs)
+                    break
+                except RetryAfter as e:
+                    delay = e.retry_after
+                    delay = delay.total_seconds() if isinstance(delay, timedelta) else delay
+                    metrics.inc("outgoing_retry_after_total", lane=lane)
+                    self.scheduler.pause(delay)
+                    if retries >= self.max_retries:
+                        raise
+                    retries += 1
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                # The message already shows this content
+                self.edits.record(endpoint, data, True)
+            else:
+                self.edits.forget(data)
+            raise
+        finally:
+            if api_span is not None:
+                # Time spent waiting for the lane's turn, the rest of the span is the HTTP call
+                api_span.set(lane=lane, wait_ms=round(waited * 1000, 1))
+                if retries:
+                    api_span.set(retries=retries)
+        self.edits.record(endpoint, data, result)
+        return result
@@ -0,0 +1,181 @@
+"""
+Overload module: shed optional work when updates wait too long to be handled.
+
+TimedUpdateQueue records how long each update waited in the update
+queue, and the outgoing scheduler reports how long each Bot API request
+waited for its turn (loading bars and broadcasts run in the background,
+so under load they pile up there rather than in the update queue). The
+OverloadController keeps a moving average of each wait (and watches the
+oldest waiting update and request, for when nothing gets through) and
+switches to degraded mode when the highest is above OVERLOAD_ENTER_MS,
+back below OVERLOAD_EXIT_MS, staying in each mode at least
+OVERLOAD_MIN_SECONDS so it doesn't flap. In degraded mode loading bars
+are skipped or cut short and the tracking of known users is deferred
+until the pressure drops, then written once per user.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from time import monotonic
+from typing import Callable, Dict, Hashable, Mapping, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Average wait (ms) that switches to degraded mode
+OVERLOAD_ENTER_MS = float(os.getenv("OVERLOAD_ENTER_MS", "2000"))
+# Average wait (ms) that switches back to normal
+OVERLOAD_EXIT_MS = float(os.getenv("OVERLOAD_EXIT_MS", "500"))
+# Shortest time (seconds) in a mode before switching again
+OVERLOAD_MIN_SECONDS = float(os.getenv("OVERLOAD_MIN_SECONDS", "10"))
+# Most deferred calls kept; beyond this the oldest runs right away
+OVERLOAD_MAX_DEFERRED = int(os.getenv("OVERLOAD_MAX_DEFERRED", "50000"))
+
+# Weight of the newest sample in the moving average
+EWMA_WEIGHT = 0.2
+# Seconds between checks of the oldest waiting update
+CHECK_INTERVAL = 1.0
+# Deferred calls run between yields to the event loop
+DRAIN_BATCH = 500
+
+
+class TimedUpdateQueue(asyncio.Queue):
+    """Update queue that reports how long each update waited."""
+
+    def __init__(self, on_wait: Optional[Callable[[float], None]] = None):
+        self.on_wait = on_wait
+        self.last_wait_ms = 0.0  # of the update taken last
+        super().__init__()
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._put_times = deque()
+
+    def _put(self, item):
+        super()._put(item)
+        self._put_times.append(monotonic())
+
+    def _get(self):
+        item = super()._get()
+        waited_ms = self.last_wait_ms = (monotonic() - self._put_times.popleft()) * 1000
+        if self.on_wait is not None:
+            self.on_wait(waited_ms)
+        return item
+
+    def oldest_wait_ms(self) -> float:
+        """How long the next update has been waiting (0 if none is)."""
+        return (monotonic() - self._put_times[0]) * 1000 if self._put_times else 0.0
+
+
+class OverloadController:
+    """Decides between normal and degraded mode from update and request wait times."""
+
+    def __init__(self, enter_ms: float = OVERLOAD_ENTER_MS, exit_ms: float = OVERLOAD_EXIT_MS,
+                 min_seconds: float = OVERLOAD_MIN_SECONDS, max_deferred: int = OVERLOAD_MAX_DEFERRED):
+        self.enter_ms = enter_ms
+        self.exit_ms = exit_ms
+        self.min_seconds = min_seconds
+        self.max_deferred = max_deferred
+        self.degraded = False
+        self.wait_ms = 0.0  # moving average of the update queue wait
+        self.outgoing_wait_ms: Dict[str, float] = {}  # lane -> moving average of the request wait
+        self._changed_at: Optional[float] = None
+        self._deferred: Dict[Hashable, Callable[[], None]] = {}
+
+    def pressure_ms(self) -> float:
+        """The highest moving average wait."""
+        return max([self.wait_ms, *self.outgoing_wait_ms.values()])
+
+    def sample(self, wait_ms: float) -> None:
+        """Record how long an update waited."""
+        self.wait_ms += EWMA_WEIGHT * (wait_ms - self.wait_ms)
+        self._decide(self.pressure_ms())
+
+    def sample_outgoing(self, lane: str, wait_ms: float) -> None:
+        """Record how long a request in a lane waited for its turn."""
+        average = self.outgoing_wait_ms.get(lane, 0.0)
+        self.outgoing_wait_ms[lane] = average + EWMA_WEIGHT * (wait_ms - average)
+        self._decide(self.pressure_ms())
+
+    def check(self, oldest_wait_ms: float, oldest_outgoing_ms: Optional[Mapping[str, float]] = None) -> None:
+        """Re-decide from the oldest waiting update and request per lane; nothing waiting counts as no wait."""
+        oldest_outgoing_ms = oldest_outgoing_ms or {}
+        if oldest_wait_ms == 0:
+            self.wait_ms -= EWMA_WEIGHT * self.wait_ms
+        for lane, oldest_ms in oldest_outgoing_ms.items():
+            if oldest_ms == 0 and lane in self.outgoing_wait_ms:
+                self.outgoing_wait_ms[lane] -= EWMA_WEIGHT * self.outgoing_wait_ms[lane]
+        self._decide(max(self.pressure_ms(), oldest_wait_ms, *oldest_outgoing_ms.values()))
+
+    def _decide(self, pressure_ms: float) -> None:
+        now = monotonic()
+        if self._changed_at is not None and now - self._changed_at < self.min_seconds:
+            return
+        if not self.degraded and pressure_ms >= self.enter_ms:
+            self._switch(True, pressure_ms, now)
+        elif self.degraded and pressure_ms <= self.exit_ms:
+            self._switch(False, pressure_ms, now)
+
+    def _switch(self, degraded: bool, pressure_ms: float, now: float) -> None:
+        self.degraded = degraded
+        self._changed_at = now
+        mode = "degraded" if degraded else "normal"
+        metrics.set_gauge("overload_degraded", 1 if degraded else 0)
+        metrics.inc("overload_mode_changes_total", mode=mode)
+        logger.warning(f"Switched to {mode} mode (waiting {pressure_ms:.0f} ms)")
+
+    def deferred(self, key: Hashable) -> Optional[Callable[[], None]]:
+        """Get the call deferred under key, if it hasn't run yet."""
+        return self._deferred.get(key)
+
+    def defer(self, key: Hashable, call: Callable[[], None]) -> None:
+        """Run call once the pressure drops; a later call with the same key replaces it."""
+        self._deferred.pop(key, None)
+        self._deferred[key] = call
+        if len(self._deferred) > self.max_deferred:
+            # Nothing deferred is lost: the oldest call runs now instead
+            metrics.inc("overload_deferred_overflow_total")
+            self.drain(1)
+        metrics.set_gauge("overload_deferred", len(self._deferred))
+
+    def drain(self, limit: Optional[int] = None) -> int:
+        """Run deferred calls, oldest first. Returns how many ran."""
+        ran = 0
+        while self._deferred and (limit is None or ran < limit):
+            key = next(iter(self._deferred))
+            call = self._deferred.pop(key)
+            try:
+                call()
+            except Exception as e:
+                logger.error(f"Error running deferred call for {key}: {e}")
+            ran += 1
+        metrics.set_gauge("overload_deferred", len(self._deferred))
+        return ran
+
+
+_controller: Optional[OverloadController] = None
+
+
+def get_overload() -> OverloadController:
+    """Get the process-wide overload controller."""
+    global _controller
+    if _controller is None:
+        _controller = OverloadController()
+    return _controller
+
+
+async def run_overload_monitor(queue: TimedUpdateQueue, interval: float = CHECK_INTERVAL,
+                               outgoing_waits: Optional[Callable[[], Mapping[str, float]]] = None) -> None:
+    """Check the waits every interval and run deferred calls in batches while not degraded."""
+    controller = get_overload()
+    while True:
+        await asyncio.sleep(interval)
+        controller.check(queue.oldest_wait_ms(), outgoing_waits() if outgoing_waits is not None else None)
+        metrics.set_gauge("update_queue_wait_ms", round(controller.wait_ms, 1))
+        for lane, wait_ms in controller.outgoing_wait_ms.items():
+            metrics.set_gauge("outgoing_lane_wait_ms", round(wait_ms, 1), lane=lane)
+        metrics.set_gauge("update_queue_size", queue.qsize())
+        while not controller.degraded and controller.drain(DRAIN_BATCH):
+            await asyncio.sleep(0)
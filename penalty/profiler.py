@@ -0,0 +1,113 @@
+"""
+Profiling module for capturing cProfile stats of slow or sampled updates.
+"""
+import asyncio
+import cProfile
+import itertools
+import os
+from collections import deque
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, List
+
+from telegram import Update
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Profile one in every N updates (0 disables sampling)
+PROFILE_SAMPLE_EVERY = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))
+# Record updates slower than this many milliseconds (0 disables)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+# Number of .prof files kept in PROFILE_DIR before the oldest are removed
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+_update_counter = itertools.count(1)
+_armed = set()  # (handler, update type) pairs whose next run gets profiled
+_profiling = False  # cProfile can only profile one run at a time
+_slow_updates = deque(maxlen=200)
+
+
+def is_enabled() -> bool:
+    """Check if profiling is switched on."""
+    return PROFILE_SAMPLE_EVERY > 0 or PROFILE_SLOW_MS > 0
+
+
+def get_update_type(update: Update) -> str:
+    """Get the update type (message, callback_query, ...) of an update."""
+    for update_type in Update.ALL_TYPES:
+        if getattr(update, update_type, None) is not None:
+            return str(update_type)
+    return "unknown"
+
+
+def _write_stats(profiler: cProfile.Profile, file_name: str) -> str:
+    """Dump profiler stats and drop the oldest files beyond PROFILE_KEEP."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, file_name)
+    profiler.dump_stats(path)
+
+    files = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".prof"))
+    for name in files[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+    return path
+
+
+async def profile_update(callback, update: Update, context):
+    """Run a handler callback, profiling it when sampled or previously slow.
+
+    A run is profiled if it is the N-th update or if the same handler and
+    update type went over PROFILE_SLOW_MS last time. Note that the stats
+    cover everything the event loop ran while the handler was in flight.
+    """
+    if not is_enabled():
+        return await callback(update, context)
+
+    global _profiling
+    handler_name = getattr(callback, "__name__", repr(callback))
+    update_type = get_update_type(update)
+    key = (handler_name, update_type)
+
+    sampled = PROFILE_SAMPLE_EVERY > 0 and next(_update_counter) % PROFILE_SAMPLE_EVERY == 0
+    profiler = None
+    if not _profiling and (sampled or key in _armed):
+        _armed.discard(key)
+        _profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    start = perf_counter()
+    try:
+        return await callback(update, context)
+    finally:
+        duration_ms = (perf_counter() - start) * 1000
+        if profiler is not None:
+            profiler.disable()
+            _profiling = False
+
+        now = datetime.now()
+        profile_path = None
+        if profiler is not None:
+            file_name = f"{now.strftime('%Y%m%d-%H%M%S-%f')}_{handler_name}_{update_type}_{int(duration_ms)}ms.prof"
+            profile_path = await asyncio.to_thread(_write_stats, profiler, file_name)
+
+        slow = PROFILE_SLOW_MS > 0 and duration_ms >= PROFILE_SLOW_MS
+        if slow and profiler is None:
+            # Profile the next run of this handler to find out why
+            _armed.add(key)
+        if slow or profiler is not None:
+            _slow_updates.append({
+                "handler": handler_name,
+                "update_type": update_type,
+                # Not every handled object is an Update (see BacklogDrained)
+                "update_id": getattr(update, "update_id", None),
+                "duration_ms": duration_ms,
+                "at": now.isoformat(),
+                "profile": os.path.basename(profile_path) if profile_path else None
+            })
+
+
+def get_worst_updates(limit: int = 10) -> List[Dict]:
+    """Get the slowest recently recorded (slow or profiled) updates, slowest first."""
+    return sorted(_slow_updates, key=lambda x: x["duration_ms"], reverse=True)[:limit]
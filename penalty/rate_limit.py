@@ -0,0 +1,78 @@
+"""
+Rate limiting module for inbound updates: per-user token buckets and
+suppression of repeated taps on the same button.
+"""
+import os
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional
+
+# Sustained updates per second allowed for one user
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "2"))
+# Updates a user may send in a quick burst
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "8"))
+# Identical taps on the same message within this many seconds are dropped
+DOUBLE_TAP_WINDOW = float(os.getenv("DOUBLE_TAP_WINDOW", "1.0"))
+# Number of users (and recent taps) remembered; the least recently seen are dropped
+RATE_LIMIT_MAX_USERS = int(os.getenv("RATE_LIMIT_MAX_USERS", "10000"))
+
+REASON_RATE = "rate"
+REASON_DUPLICATE = "duplicate"
+
+
+class RateLimiter:
+    """Token buckets per user and recent callback taps, both LRU-bounded."""
+
+    def __init__(self, rate: float = RATE_LIMIT_RATE, burst: float = RATE_LIMIT_BURST,
+                 double_tap_window: float = DOUBLE_TAP_WINDOW, max_users: int = RATE_LIMIT_MAX_USERS):
+        self.rate = rate
+        self.burst = burst
+        self.double_tap_window = double_tap_window
+        self.max_users = max_users
+        self._buckets: OrderedDict = OrderedDict()  # user_id -> [tokens, last refill]
+        self._taps: OrderedDict = OrderedDict()  # (chat_id, message_id, data) -> time
+
+    def _remember(self, table: OrderedDict, key, value) -> None:
+        """Store a value as most recently used and evict beyond max_users."""
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_users:
+            table.popitem(last=False)
+
+    def allow(self, user_id: int, now: Optional[float] = None) -> bool:
+        """Take a token from the user's bucket, returning False if it is empty."""
+        now = monotonic() if now is None else now
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        self._remember(self._buckets, user_id, bucket)
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def is_double_tap(self, chat_id: int, message_id: int, data: str, now: Optional[float] = None) -> bool:
+        """Check if the same button on the same message was tapped within the window."""
+        now = monotonic() if now is None else now
+        key = (chat_id, message_id, data)
+        last_tap = self._taps.get(key)
+        self._remember(self._taps, key, now)
+        return last_tap is not None and now - last_tap < self.double_tap_window
+
+    def check(self, update) -> Optional[str]:
+        """Get the reason an update should be dropped, or None to let it through."""
+        user = update.effective_user
+        if user is None:
+            return None
+
+        query = update.callback_query
+        if query is not None and query.message is not None and query.data is not None:
+            if self.is_double_tap(query.message.chat.id, query.message.message_id, query.data):
+                return REASON_DUPLICATE
+
+        if not self.allow(user.id):
+            return REASON_RATE
+        return None
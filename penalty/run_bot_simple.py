@@ -7,11 +7,10 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Enable detailed logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG
-)
+# Enable detailed logging (DEBUG unless LOG_LEVEL is set; LOG_DEBUG_SAMPLE thins it out)
+os.environ.setdefault("LOG_LEVEL", "DEBUG")
+from log_setup import setup_logging
+setup_logging()
 logger = logging.getLogger(__name__)
 
 try:
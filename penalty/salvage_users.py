@@ -0,0 +1,210 @@
+"""Recover the intact user records from a damaged users_data.json.
+
+The file is scanned once, a chunk at a time: every '"<user_id>": {'
+is a candidate record, and candidates that decode to a complete user
+record with a matching user_id are kept. Everything in between is
+reported as damaged, with the user_ids that could still be seen in it,
+so the time taken grows linearly with the file size and memory only
+with the recovered users.
+
+The recovered users are written to <input>.salvaged (nothing is
+replaced); check the report, then move it over users_data.json with
+the bot stopped.
+
+Usage: python salvage_users.py [input] [--output PATH] [--report PATH]
+"""
+import argparse
+import codecs
+import json
+import re
+import sys
+from collections import Counter
+from time import monotonic
+from typing import Dict, Iterator, List, Tuple
+
+from user_tracker import USER_DATA_FILE, STATUS_ACTIVE, dump_users_json
+
+CHUNK_SIZE = 1024 * 1024
+# Candidates longer than this are treated as damaged instead of reading on
+MAX_RECORD_CHARS = 1024 * 1024
+# Lost user_ids and damaged regions listed on the console (all go to --report)
+SHOWN = 20
+
+RECORD_START = re.compile(r'"(\d+)"\s*:\s*\{')
+USER_ID = re.compile(r'"user_id"\s*:\s*(\d+)')
+
+
+class Salvage:
+    """Result of scanning a damaged file."""
+
+    def __init__(self):
+        self.users: Dict[str, Dict] = {}
+        self.duplicates = 0
+        self.damaged: List[Dict] = []  # {"start", "end" (byte offsets), "excerpt"}
+        self.seen_ids = set()  # user_ids noticed inside damaged regions
+
+    @property
+    def lost_ids(self) -> List[int]:
+        """User IDs seen in damaged regions that were not recovered anywhere."""
+        return sorted(user_id for user_id in self.seen_ids if str(user_id) not in self.users)
+
+    @property
+    def damaged_bytes(self) -> int:
+        return sum(region["end"] - region["start"] for region in self.damaged)
+
+
+def _valid_user(key: str, user) -> bool:
+    """Check if a decoded candidate is a complete user record for its key."""
+    if not isinstance(user, dict) or user.get("user_id") != int(key):
+        return False
+    try:
+        json.dumps(user, ensure_ascii=False).encode("utf-8")
+    except UnicodeEncodeError:
+        return False  # invalid bytes decoded as surrogates
+    return True
+
+
+def _is_structure(text: str) -> bool:
+    """Check if text between records is only the object's own punctuation."""
+    return not text.strip(" \t\r\n,{}")
+
+
+def scan(f) -> Iterator[Tuple[str, object, int, int]]:
+    """Scan a binary file, yielding ("user", (key, user), start, end) and ("damaged", text, start, end).
+
+    A long damaged region is yielded in consecutive pieces.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="surrogateescape")
+    parser = json.JSONDecoder()
+    buffer = ""
+    pos = 0  # scanned up to here
+    gap_start = 0  # start of text not yet accounted for
+    cursor = [0, 0]  # a buffer index and its byte offset in the file
+    eof = False
+
+    def byte_offset(index: int) -> int:
+        # Encode only the text between the last position asked for and this one
+        low, high = sorted((cursor[0], index))
+        length = len(buffer[low:high].encode("utf-8", "surrogateescape"))
+        cursor[1] += length if index >= cursor[0] else -length
+        cursor[0] = index
+        return cursor[1]
+
+    def damaged(start: int, end: int):
+        text = buffer[start:end]
+        if not _is_structure(text):
+            start_offset = byte_offset(start)
+            return "damaged", text, start_offset, byte_offset(end)
+        return None
+
+    while True:
+        match = RECORD_START.search(buffer, pos)
+        if match is None or (not eof and len(buffer) - match.start() < MAX_RECORD_CHARS):
+            if not eof:
+                # Drop what was scanned, keeping a possible partial match
+                keep = max(pos, len(buffer) - 64) if match is None else match.start()
+                if gap_start < keep:
+                    piece = damaged(gap_start, keep)
+                    if piece:
+                        yield piece
+                    gap_start = keep
+                byte_offset(keep)
+                buffer = buffer[keep:]
+                cursor[0] -= keep
+                pos -= keep
+                gap_start -= keep
+                data = f.read(CHUNK_SIZE)
+                eof = not data
+                buffer += decoder.decode(data, final=eof)
+                continue
+            if match is None:
+                break
+        try:
+            user, end = parser.raw_decode(buffer, match.end() - 1)
+        except ValueError:
+            pos = match.start() + 1
+            continue
+        key = match.group(1)
+        if not _valid_user(key, user):
+            pos = match.start() + 1
+            continue
+        piece = damaged(gap_start, match.start())
+        if piece:
+            yield piece
+        yield "user", (key, user), byte_offset(match.start()), byte_offset(end)
+        pos = gap_start = end
+
+    piece = damaged(gap_start, len(buffer))
+    if piece:
+        yield piece
+
+
+def salvage(path: str) -> Salvage:
+    """Scan a users file and collect what can be recovered."""
+    result = Salvage()
+    with open(path, "rb") as f:
+        for kind, item, start, end in scan(f):
+            if kind == "user":
+                key, user = item
+                if key in result.users:
+                    result.duplicates += 1  # keep the later copy, like json.load
+                result.users[key] = user
+            else:
+                result.seen_ids.update(int(user_id) for user_id in USER_ID.findall(item))
+                result.seen_ids.update(int(user_id) for user_id in RECORD_START.findall(item))
+                if result.damaged and result.damaged[-1]["end"] == start:
+                    result.damaged[-1]["end"] = end  # next piece of the same region
+                    continue
+                result.damaged.append({
+                    "start": start,
+                    "end": end,
+                    "excerpt": item.strip()[:80].encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+                })
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Recover the intact user records from a damaged users file.")
+    parser.add_argument("input", nargs="?", default=USER_DATA_FILE)
+    parser.add_argument("--output", help="recovered users file (default: <input>.salvaged)")
+    parser.add_argument("--report", help="also write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    started = monotonic()
+    result = salvage(args.input)
+    output_path = args.output or args.input + ".salvaged"
+    with open(output_path, "w", encoding="utf-8") as f:
+        dump_users_json(iter(result.users.items()), f)
+
+    statuses = Counter(user.get("status", STATUS_ACTIVE) for user in result.users.values())
+    lost_ids = result.lost_ids
+    print(f"Recovered {len(result.users)} users in {monotonic() - started:.1f} s -> {output_path}")
+    for status, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+        print(f"  {status}: {count}")
+    if result.duplicates:
+        print(f"Duplicate records (later copy kept): {result.duplicates}")
+    if not result.damaged:
+        print("No damage found.")
+    else:
+        print(f"Damaged regions: {len(result.damaged)} ({result.damaged_bytes} bytes)")
+        for region in result.damaged[:SHOWN]:
+            print(f"  bytes {region['start']}-{region['end']}: {region['excerpt']!r}")
+        print(f"Users lost: {len(lost_ids)} with readable IDs (records wiped out entirely can't be named)")
+        if lost_ids:
+            more = f" and {len(lost_ids) - SHOWN} more" if len(lost_ids) > SHOWN else ""
+            print(f"  {', '.join(map(str, lost_ids[:SHOWN]))}{more}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({
+                "recovered": len(result.users),
+                "statuses": statuses,
+                "duplicates": result.duplicates,
+                "damaged": result.damaged,
+                "lost_ids": lost_ids
+            }, f, indent=2)
+    return 1 if result.damaged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
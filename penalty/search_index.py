@@ -0,0 +1,140 @@
+"""
+Search index module for finding subscribers by name and username.
+
+Each user's lowercased "@username first_name last_name" is packed into
+one newline-separated string, so a substring search is a str.find scan
+in C (a few milliseconds for 1M users) instead of a loop over records.
+Changes made after the packed string was built are kept in a small
+overlay that is searched too, and folded in by a rebuild once it grows.
+"""
+import asyncio
+import logging
+import os
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Changed users kept in the overlay before the packed string is rebuilt
+SEARCH_REBUILD_AFTER = int(os.getenv("SEARCH_REBUILD_AFTER", "10000"))
+# Matches looked at before ranking; the first ones found win beyond this
+SEARCH_SCAN_LIMIT = 500
+
+
+def search_text(user: Dict) -> str:
+    """Get the searchable text of a user (the fields format_user_name shows)."""
+    parts = []
+    if user.get("username"):
+        parts.append(f"@{user['username']}")
+    for field in ("first_name", "last_name"):
+        if user.get(field):
+            parts.append(str(user[field]))
+    return " ".join(parts).casefold().replace("\n", " ")
+
+
+class PackedNames:
+    """Search texts of many users packed into one string."""
+
+    def __init__(self, users: Iterable[Tuple[str, Dict]] = ()):
+        texts = []
+        self.ids = array("q")
+        self.offsets = array("q")
+        offset = 0
+        for _, user in users:
+            user_id = user.get("user_id")
+            if not isinstance(user_id, int):
+                continue
+            text = search_text(user)
+            self.ids.append(user_id)
+            self.offsets.append(offset)
+            texts.append(text)
+            offset += len(text) + 1
+        self.text = "\n".join(texts)
+
+    def find(self, query: str, limit: int) -> Iterable[Tuple[int, str, int]]:
+        """Yield (user_id, text, match position) for up to limit users containing query."""
+        found = 0
+        position = self.text.find(query)
+        while position >= 0 and found < limit:
+            entry = bisect_right(self.offsets, position) - 1
+            start = self.offsets[entry]
+            end = self.text.find("\n", start)
+            end = len(self.text) if end < 0 else end
+            if position + len(query) <= end:  # not running into the next user
+                yield self.ids[entry], self.text[start:end], position - start
+                found += 1
+            position = self.text.find(query, end + 1)
+
+
+def _rank(text: str, position: int) -> Tuple[int, int]:
+    """Sort key: matches at the start of a word first, then shorter names."""
+    at_word_start = position == 0 or text[position - 1] in " @"
+    return (0 if at_word_start else 1, len(text))
+
+
+class SearchIndex:
+    """Substring search over all users, kept up to date as users change."""
+
+    def __init__(self):
+        self.packed: Optional[PackedNames] = None
+        self._overlay: Dict[int, Tuple[int, Optional[str]]] = {}  # user_id -> (version, text or None if removed)
+        self._version = 0
+        self._build_task: Optional[asyncio.Task] = None
+
+    def update(self, user: Dict) -> None:
+        """Record a user's current names."""
+        user_id = user.get("user_id")
+        if isinstance(user_id, int):
+            self._version += 1
+            self._overlay[user_id] = (self._version, search_text(user))
+
+    def remove(self, user_id: int) -> None:
+        self._version += 1
+        self._overlay[user_id] = (self._version, None)
+
+    async def _build(self, users: Iterable[Tuple[str, Dict]]) -> None:
+        start_version = self._version
+        try:
+            packed = await asyncio.to_thread(PackedNames, users)
+        except Exception as e:
+            logger.error(f"Error building the search index: {e}")
+            return
+        self.packed = packed
+        # Keep only the changes made while packing
+        self._overlay = {user_id: entry for user_id, entry in self._overlay.items() if entry[0] > start_version}
+        logger.info(f"Search index packed {len(packed.ids)} users ({len(packed.text) // 1024} KB)")
+
+    @property
+    def ready(self) -> bool:
+        """Check if the index has been built and can be searched."""
+        return self.packed is not None
+
+    def ensure_built(self, view: Callable[[], Iterable[Tuple[str, Dict]]]) -> bool:
+        """Start building the index if it wasn't built, or rebuilding it once the overlay is large.
+
+        Packing runs in a worker thread, in the background; view is called
+        on the event loop to capture the users to pack. Returns whether
+        the index can be searched yet.
+        """
+        task = self._build_task
+        if task is None or (task.done() and (self.packed is None or len(self._overlay) > SEARCH_REBUILD_AFTER)):
+            self._build_task = asyncio.get_running_loop().create_task(self._build(view()))
+        return self.ready
+
+    def search(self, query: str, limit: int = 10) -> List[int]:
+        """Get the user_ids whose name or username contains query, best matches first."""
+        query = query.strip().casefold()
+        if not query or self.packed is None:
+            return []
+
+        candidates: Dict[int, Tuple[int, int]] = {}
+        for user_id, (_, text) in self._overlay.items():
+            position = text.find(query) if text is not None else -1
+            if position >= 0:
+                candidates[user_id] = _rank(text, position)
+        for user_id, text, position in self.packed.find(query, SEARCH_SCAN_LIMIT):
+            if user_id not in self._overlay:  # otherwise changed since packing
+                candidates[user_id] = _rank(text, position)
+
+        return sorted(candidates, key=candidates.get)[:limit]
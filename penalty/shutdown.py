@@ -0,0 +1,130 @@
+"""
+Shutdown module: graceful stops with a deadline, and warm restarts.
+
+On SIGTERM or SIGINT the bot stops fetching updates and running loading
+bars jump to 100%, so the queued updates drain quickly. If that takes
+longer than SHUTDOWN_DEADLINE, the state is saved and the process exits
+anyway. Flows that had not finished (a loading bar still on screen) are
+saved to INFLIGHT_FILE and completed by the next start.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+from time import perf_counter, time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INFLIGHT_FILE = "inflight.json"
+# Seconds from a stop signal until the process exits, even with updates still being handled
+SHUTDOWN_DEADLINE = float(os.getenv("SHUTDOWN_DEADLINE", "8"))
+# Saved flows older than this many seconds are dropped instead of completed
+INFLIGHT_MAX_AGE = float(os.getenv("INFLIGHT_MAX_AGE", "600"))
+# Log a warning when getting ready takes longer than this many seconds
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", "5"))
+
+_stopping = asyncio.Event()
+_stop_started: Optional[float] = None
+
+
+def is_stopping() -> bool:
+    """Check if shutdown has started."""
+    return _stopping.is_set()
+
+
+def stopping_for() -> Optional[float]:
+    """Get the seconds since shutdown started, or None if it hasn't."""
+    return None if _stop_started is None else perf_counter() - _stop_started
+
+
+async def sleep_unless_stopping(seconds: float) -> None:
+    """Sleep, waking up early when shutdown starts."""
+    try:
+        await asyncio.wait_for(_stopping.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+def install_stop_handler(on_deadline: Callable[[], None], deadline: float = SHUTDOWN_DEADLINE) -> None:
+    """Start a graceful shutdown on SIGTERM/SIGINT, calling on_deadline if it runs past the deadline.
+
+    A second signal calls on_deadline right away.
+    """
+    loop = asyncio.get_running_loop()
+
+    def stop():
+        global _stop_started
+        if _stopping.is_set():
+            on_deadline()
+            return
+        _stop_started = perf_counter()
+        _stopping.set()
+        logger.info(f"Stop signal received, shutting down (deadline {deadline:.0f} s)")
+        loop.call_later(deadline, on_deadline)
+        # Leaves run_polling, which then stops the updater and drains the queue
+        raise SystemExit
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop)
+
+
+class InFlight:
+    """Flows with an animation on screen, saved at shutdown and completed by the next start."""
+
+    def __init__(self, path: str = INFLIGHT_FILE):
+        self.path = path
+        self._entries: Dict[str, Dict] = {}
+        self._next_key = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, kind: str, **fields) -> str:
+        """Record a started flow; returns the key to discard it with once finished."""
+        self._next_key += 1
+        key = str(self._next_key)
+        self._entries[key] = {"kind": kind, "started": time(), **fields}
+        return key
+
+    def discard(self, key: str) -> None:
+        """Forget a finished flow."""
+        self._entries.pop(key, None)
+
+    def save(self) -> None:
+        """Write the unfinished flows, or remove the file if there are none."""
+        if not self._entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._entries.values()), f)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved {len(self._entries)} unfinished flows")
+
+    def take_saved(self, max_age: float = INFLIGHT_MAX_AGE) -> List[Dict]:
+        """Read and remove the flows saved by the previous process, without the stale ones."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (ValueError, OSError) as e:
+            logger.warning(f"Could not read {self.path}: {e}")
+            entries = []
+        os.remove(self.path)
+        now = time()
+        return [entry for entry in entries if isinstance(entry, dict) and now - entry.get("started", 0) <= max_age]
+
+
+_inflight: Optional[InFlight] = None
+
+
+def get_inflight() -> InFlight:
+    """Get the process-wide in-flight flows."""
+    global _inflight
+    if _inflight is None:
+        _inflight = InFlight()
+    return _inflight
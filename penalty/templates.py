@@ -0,0 +1,242 @@
+"""
+Message templates compiled once from the content in config.py.
+
+Handlers read the current templates with get_templates() and only fill
+in per-user fields, instead of looking up and rebuilding config content
+on every update.
+"""
+import string
+from html.parser import HTMLParser
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import MessageLimit, ParseMode
+
+from tracing import traced
+
+# Fallback texts for commands missing from BOT_CONFIG["command_messages"]
+DEFAULT_COMMAND_MESSAGES = {
+    "chicken": "<b>🐔 Script Chicken</b>\n\nInformation coming soon!",
+    "mines": "<b>💎 Script Mines</b>\n\nInformation coming soon!",
+    "icefield": "<b>🐼 Script Icefield</b>\n\nInformation coming soon!",
+    "info": "<b>ℹ️ Bot Information</b>\n\nInformation coming soon!",
+    "status": "<b>📊 Bot Status</b>\n\nStatus: Online ✅",
+    "contact": "<b>📞 Contact Information</b>\n\nContact info coming soon!",
+    "download": "<b>⬇️ Download Information</b>\n\nDownload info coming soon!"
+}
+
+DEFAULT_HELP_TEXT = """
+<b>📚 Available Commands</b>
+
+<b>Main Commands:</b>
+<code>/start</code> - Start the bot and see welcome message
+<code>/help</code> - Show this help message
+<code>/info</code> - Get bot information
+<code>/status</code> - Check bot status
+
+<b>Script Commands:</b>
+<code>/chicken</code> - Get chicken script information 🐔
+<code>/mines</code> - Get mines script information 💎
+<code>/icefield</code> - Get icefield script information 🐼
+
+<b>Other Commands:</b>
+<code>/contact</code> - Contact information
+<code>/download</code> - Download information
+<code>/echo &lt;text&gt;</code> - Echo back your message
+<code>/style</code> - See formatting examples
+<code>/buttons</code> - Interactive button demo
+
+<b>💡 Tip:</b> You can also use the inline buttons for quick access!
+        """
+
+BACK_TO_MENU_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Menu", callback_data="back_to_start")]])
+DOWNLOAD_MARKUP = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🐔 Chicken", callback_data="help"),
+        InlineKeyboardButton("💎 Mines", callback_data="settings")
+    ],
+    [
+        InlineKeyboardButton("🐼 Icefield", callback_data="about")
+    ]
+])
+COMMAND_MARKUPS = {
+    "chicken": BACK_TO_MENU_MARKUP,
+    "mines": BACK_TO_MENU_MARKUP,
+    "icefield": BACK_TO_MENU_MARKUP,
+    "download": DOWNLOAD_MARKUP
+}
+
+# Tags Telegram accepts in HTML messages
+HTML_TAGS = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "span", "tg-spoiler",
+             "a", "code", "pre", "blockquote", "tg-emoji"}
+
+
+class MessageTemplate(NamedTuple):
+    """A ready-to-send message."""
+    text: str
+    parse_mode: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+
+class ButtonAction(NamedTuple):
+    """A button action from BOT_CONFIG["button_actions"]."""
+    type: str
+    content: str
+
+
+class WelcomeTemplate(NamedTuple):
+    """The back_to_start welcome message with a first_name slot."""
+    prefix: str
+    suffix: str
+    custom: Optional[str]
+    parse_mode: str
+    reply_markup: InlineKeyboardMarkup
+
+    @traced("template.render_welcome")
+    def render(self, first_name: Optional[str]) -> str:
+        """Fill in the user's first name."""
+        if self.custom is not None:
+            return self.custom.format(first_name=first_name)
+        return f"{self.prefix}{first_name}{self.suffix}"
+
+
+class CompiledConfig(NamedTuple):
+    """Everything handlers need from config.py, compiled and immutable."""
+    parse_mode: str
+    commands: Mapping[str, MessageTemplate]
+    button_actions: Mapping[str, ButtonAction]
+    welcome: WelcomeTemplate
+    help_text: str
+    about_text: str
+
+
+class _TagChecker(HTMLParser):
+    """Check that HTML only uses supported tags and that they are balanced."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.open_tags = []
+        self.errors = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in HTML_TAGS:
+            self.errors.append(f"unsupported tag <{tag}>")
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.open_tags or self.open_tags.pop() != tag:
+            self.errors.append(f"unexpected </{tag}>")
+
+
+def _validate(name: str, text: str, parse_mode: str) -> str:
+    """Check a message text, raising ValueError with the template name."""
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError(f"Template {name!r} is empty")
+    if len(text) > MessageLimit.MAX_TEXT_LENGTH:
+        raise ValueError(f"Template {name!r} is longer than {MessageLimit.MAX_TEXT_LENGTH} characters")
+    if parse_mode == ParseMode.HTML:
+        checker = _TagChecker()
+        checker.feed(text)
+        checker.close()
+        errors = checker.errors + [f"unclosed <{tag}>" for tag in checker.open_tags]
+        if errors:
+            raise ValueError(f"Template {name!r} has invalid HTML: {', '.join(errors)}")
+    return text
+
+
+def _validate_custom_start(text: str) -> str:
+    """Check that a custom start message only uses the {first_name} field."""
+    try:
+        fields = {field for _, field, _, _ in string.Formatter().parse(text) if field is not None}
+    except ValueError as e:
+        raise ValueError(f"Custom start message is not a valid format string: {e}")
+    if fields - {"first_name"}:
+        raise ValueError(f"Custom start message uses unknown fields: {', '.join(sorted(fields - {'first_name'}))}")
+    return text
+
+
+@traced("template.compile")
+def compile_templates(bot_config: Dict, custom_messages: Dict) -> CompiledConfig:
+    """Compile config content into templates, raising ValueError if it's invalid."""
+    parse_mode = ParseMode.HTML if bot_config["use_html"] else ParseMode.MARKDOWN_V2
+
+    command_messages = bot_config.get("command_messages", {})
+    commands = {}
+    for name, default in DEFAULT_COMMAND_MESSAGES.items():
+        text = _validate(name, command_messages.get(name, default), parse_mode)
+        commands[name] = MessageTemplate(text, parse_mode, COMMAND_MARKUPS.get(name))
+
+    button_actions = {}
+    for data, action in bot_config.get("button_actions", {}).items():
+        action_type = action.get("type", "message")
+        content = action.get("content", "")
+        if action_type != "alert":
+            _validate(f"button_actions.{data}", content, parse_mode)
+        button_actions[data] = ButtonAction(action_type, content)
+
+    labels = bot_config["button_labels"]
+    start_markup = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(labels["help"], callback_data="help"),
+            InlineKeyboardButton(labels["settings"], callback_data="settings")
+        ],
+        [
+            InlineKeyboardButton(labels["about"], callback_data="about")
+        ]
+    ])
+
+    features_text = "\n".join([f"• {feature}" for feature in bot_config["features"]])
+    custom_start = custom_messages.get("start")
+    welcome = WelcomeTemplate(
+        prefix=f"\n<b>{bot_config['welcome_emoji']} {bot_config['welcome_title']}, ",
+        suffix=f"""!</b>
+
+<i>{bot_config['welcome_subtitle']}</i>
+
+{bot_config['primary_emoji']} <b>Features:</b>
+{features_text}
+            """,
+        custom=_validate_custom_start(custom_start) if custom_start else None,
+        parse_mode=parse_mode,
+        reply_markup=start_markup
+    )
+    _validate("welcome", welcome.render("User"), parse_mode)
+
+    help_text = _validate("help", custom_messages.get("help") or DEFAULT_HELP_TEXT, ParseMode.HTML)
+    about_text = custom_messages.get("about") or f"""
+<b>{bot_config['info_emoji']} About</b>
+
+This is a customizable Telegram bot.
+You can style it however you want!
+
+Edit <code>config.py</code> to customize messages and styling.
+            """
+    _validate("about", about_text, parse_mode)
+
+    return CompiledConfig(
+        parse_mode=parse_mode,
+        commands=MappingProxyType(commands),
+        button_actions=MappingProxyType(button_actions),
+        welcome=welcome,
+        help_text=help_text,
+        about_text=about_text
+    )
+
+
+_templates: Optional[CompiledConfig] = None
+
+
+def get_templates() -> CompiledConfig:
+    """Get the current compiled templates, compiling config.py on first use."""
+    global _templates
+    if _templates is None:
+        from config import BOT_CONFIG, CUSTOM_MESSAGES
+        _templates = compile_templates(BOT_CONFIG, CUSTOM_MESSAGES)
+    return _templates
+
+
+def set_templates(templates: CompiledConfig) -> None:
+    """Swap in new templates; updates already being handled keep the old ones."""
+    global _templates
+    _templates = templates
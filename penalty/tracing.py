@@ -0,0 +1,277 @@
+"""
+Tracing module: per-update traces made of timed spans, kept locally.
+
+Each sampled update gets a trace whose spans nest like the calls they
+time: handler callbacks, user store reads and writes, template rendering
+and every Bot API request (with the time spent waiting for its lane).
+Spans are tied to the update through a context variable, so code that
+runs outside an update (background tasks) records nothing.
+
+Finished traces are kept in a ring buffer of TRACE_BUFFER traces for
+/trace, and appended as NDJSON to TRACE_FILE (rotated at
+TRACE_FILE_MAX_BYTES) if it is set. File writes happen off-loop, like
+log records.
+"""
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from collections import deque
+from datetime import datetime
+from time import perf_counter, time
+from typing import Dict, Iterator, List, Optional
+
+# Fraction of updates that are traced (0 disables tracing)
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "1.0"))
+# Number of finished traces kept in memory
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "500"))
+# NDJSON file finished traces are appended to ("" keeps them in memory only)
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Size at which TRACE_FILE is rotated, and how many rotated files are kept
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+
+# Spans recorded per trace; later ones are counted but dropped
+MAX_SPANS = 200
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("trace_span", default=None)
+_finished: deque = deque(maxlen=TRACE_BUFFER)
+_file_logger: Optional[logging.Logger] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class Trace:
+    """The spans of one update."""
+    __slots__ = ("trace_id", "started_at", "spans", "dropped", "done")
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.started_at = time()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.done = False
+
+
+class Span:
+    """A timed piece of work within a trace."""
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attrs")
+
+    def __init__(self, trace: Trace, parent_id: Optional[int], name: str, attrs: Dict):
+        self.trace = trace
+        self.span_id = len(trace.spans)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        """Add attributes to the span."""
+        self.attrs.update(attrs)
+
+
+def current_span() -> Optional[Span]:
+    """Get the innermost open span, or None outside a traced update."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def _run(span: Span) -> Iterator[Span]:
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.attrs["exception"] = type(e).__name__
+        raise
+    finally:
+        span.end = perf_counter()
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def start_trace(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """Trace the work done inside the block (if sampled), with a root span called name."""
+    if TRACE_SAMPLE <= 0 or (TRACE_SAMPLE < 1 and random.random() >= TRACE_SAMPLE):
+        yield None
+        return
+    trace = Trace()
+    root = Span(trace, None, name, attrs)
+    trace.spans.append(root)
+    try:
+        with _run(root):
+            yield root
+    finally:
+        trace.done = True
+        _finish(trace)
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """Time the block as a child of the current span; does nothing outside a trace."""
+    parent = _current.get()
+    if parent is None or parent.trace.done:
+        yield None
+        return
+    trace = parent.trace
+    if len(trace.spans) >= MAX_SPANS:
+        trace.dropped += 1
+        yield None
+        return
+    child = Span(trace, parent.span_id, name, attrs)
+    trace.spans.append(child)
+    with _run(child):
+        yield child
+
+
+def traced(name: str):
+    """Decorate a regular function so each call is a span."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _to_record(trace: Trace) -> Dict:
+    root = trace.spans[0]
+    record = {
+        "trace_id": trace.trace_id,
+        "name": root.name,
+        "time": datetime.fromtimestamp(trace.started_at).isoformat(),
+        "duration_ms": round((root.end - root.start) * 1000, 2),
+        "attrs": dict(root.attrs),
+        "spans": [
+            {
+                "id": s.span_id,
+                "parent": s.parent_id,
+                "name": s.name,
+                "start_ms": round((s.start - root.start) * 1000, 2),
+                # Spans still open when the update finished (tasks it left running) have no duration
+                "duration_ms": None if s.end is None else round((s.end - s.start) * 1000, 2),
+                **({"attrs": dict(s.attrs)} if s.attrs else {})
+            }
+            for s in trace.spans[1:]
+        ]
+    }
+    if trace.dropped:
+        record["dropped_spans"] = trace.dropped
+    return record
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """Queues the trace record as it is, so it is only encoded in the writer thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _RecordFormatter(logging.Formatter):
+    """One trace record per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+def _get_file_logger() -> logging.Logger:
+    """Start writing TRACE_FILE from a listener thread."""
+    global _file_logger, _listener
+    if _file_logger is None:
+        file_handler = logging.handlers.RotatingFileHandler(
+            TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8"
+        )
+        file_handler.setFormatter(_RecordFormatter())
+        trace_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(trace_queue, file_handler)
+        _listener.start()
+        atexit.register(stop_tracing)
+
+        _file_logger = logging.getLogger("traces")
+        _file_logger.propagate = False
+        _file_logger.setLevel(logging.INFO)
+        _file_logger.addHandler(_RecordQueueHandler(trace_queue))
+    return _file_logger
+
+
+def _finish(trace: Trace) -> None:
+    record = _to_record(trace)
+    _finished.append(record)
+    if TRACE_FILE:
+        _get_file_logger().info(record)
+
+
+def stop_tracing() -> None:
+    """Write the queued traces to TRACE_FILE and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_traces() -> List[Dict]:
+    """Get the buffered traces, oldest first."""
+    return list(_finished)
+
+
+def dump_traces(traces: List[Dict]) -> bytes:
+    """Encode trace records as NDJSON."""
+    return "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in traces).encode("utf-8")
+
+
+def find_trace(key: str) -> Optional[Dict]:
+    """Get a buffered trace by trace id (or its start), or the slowest one with that name."""
+    traces = get_traces()
+    for record in reversed(traces):
+        if record["trace_id"].startswith(key):
+            return record
+    named = [record for record in traces if record["name"] == key]
+    return max(named, key=lambda record: record["duration_ms"]) if named else None
+
+
+def summarize(traces: List[Dict]) -> List[Dict]:
+    """Per trace name: count, average and slowest duration, and the slowest trace id; slowest first."""
+    by_name: Dict[str, Dict] = {}
+    for record in traces:
+        entry = by_name.setdefault(record["name"], {"name": record["name"], "count": 0, "total_ms": 0.0,
+                                                    "max_ms": 0.0, "slowest": None})
+        entry["count"] += 1
+        entry["total_ms"] += record["duration_ms"]
+        if entry["slowest"] is None or record["duration_ms"] > entry["max_ms"]:
+            entry["max_ms"] = record["duration_ms"]
+            entry["slowest"] = record["trace_id"]
+    for entry in by_name.values():
+        entry["avg_ms"] = entry.pop("total_ms") / entry["count"]
+    return sorted(by_name.values(), key=lambda entry: entry["max_ms"], reverse=True)
+
+
+def format_trace(record: Dict, max_lines: int = 60) -> str:
+    """Render a trace as an indented tree with start offsets and durations (ms)."""
+    children: Dict[Optional[int], List[Dict]] = {}
+    for s in record["spans"]:
+        children.setdefault(s["parent"], []).append(s)
+
+    lines = [f"{'start':>8} {'ms':>8}  {record['name']} ({record['duration_ms']:.1f} ms)"]
+
+    def add(parent_id: Optional[int], depth: int) -> None:
+        for s in children.get(parent_id, ()):
+            duration = "open" if s["duration_ms"] is None else f"{s['duration_ms']:.1f}"
+            attrs = " ".join(f"{key}={value}" for key, value in s.get("attrs", {}).items())
+            lines.append(f"{s['start_ms']:>8.1f} {duration:>8}  {'  ' * depth}{s['name']} {attrs}".rstrip())
+            add(s["id"], depth + 1)
+
+    # Top-level spans have the root (id 0) as parent
+    add(0, 0)
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"... {len(lines) - max_lines} more spans"]
+    if record.get("dropped_spans"):
+        lines.append(f"... {record['dropped_spans']} spans not recorded")
+    return "\n".join(lines)
@@ -0,0 +1,96 @@
+"""
+Update ledger module: remembers which update_ids were already handled.
+
+The last UPDATE_LEDGER_SIZE update_ids are kept in a ring buffer with a
+set for O(1) lookups. Only those count as handled: Telegram only
+delivers again the updates whose offset wasn't confirmed, which are all
+recent, and it may restart update_ids at a lower value after a quiet
+week, so an id older than the ring is not a duplicate. An update is
+added once its handlers have finished, and the ledger is saved with the
+user store.
+
+After a crash, the updates Telegram delivers again are therefore handled
+at least once. One that was cut short is handled again, even if part of
+its effects (say its user tracking) was already saved and now counts
+twice, so its reply can be sent twice.
+
+Work a handler hands to a background task (broadcasts, loading bars) is
+at most once: the update counts as handled when the handler returns,
+and by the time the task finishes Telegram has long been told the
+update arrived. A crash mid-broadcast leaves the rest unsent, and a
+loading bar cut short by a crash stays on screen (shutdown.InFlight
+only finishes those after a graceful stop).
+"""
+import os
+import struct
+from array import array
+from typing import Optional
+
+UPDATE_LEDGER_FILE = "processed_updates.bin"
+# Recent update_ids remembered
+UPDATE_LEDGER_SIZE = int(os.getenv("UPDATE_LEDGER_SIZE", "1024"))
+
+MAGIC = b"UPDLEDG1"
+# magic, high-water mark, id count
+HEADER = struct.Struct("<8sqI")
+
+
+class UpdateLedger:
+    """Ring buffer of recently handled update_ids plus the highest one seen."""
+
+    def __init__(self, size: int = UPDATE_LEDGER_SIZE):
+        self.size = size
+        self.high_water = -1
+        self.changed = False
+        self._ring = array("q")
+        self._next = 0  # ring position to overwrite next once full
+        self._recent = set()
+
+    def seen(self, update_id: int) -> bool:
+        """Check if an update was handled recently."""
+        return update_id in self._recent
+
+    def add(self, update_id: int) -> None:
+        """Record an update as handled."""
+        if len(self._ring) < self.size:
+            self._ring.append(update_id)
+        else:
+            self._recent.discard(self._ring[self._next])
+            self._ring[self._next] = update_id
+            self._next = (self._next + 1) % self.size
+        self._recent.add(update_id)
+        self.high_water = max(self.high_water, update_id)
+        self.changed = True
+
+    def dump(self) -> Optional[bytes]:
+        """Serialize the ledger if it changed since the last dump."""
+        if not self.changed:
+            return None
+        self.changed = False
+        ids = self._ring[self._next:] + self._ring[:self._next]  # oldest first
+        return HEADER.pack(MAGIC, self.high_water, len(ids)) + ids.tobytes()
+
+    @staticmethod
+    def write(path: str, data: bytes) -> None:
+        """Write dumped ledger data atomically."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> "UpdateLedger":
+        """Read a saved ledger, starting empty if there is none or it's unreadable."""
+        try:
+            with open(path, "rb") as f:
+                magic, high_water, count = HEADER.unpack(f.read(HEADER.size))
+                ids = array("q")
+                ids.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return self
+        if magic != MAGIC:
+            return self
+        for update_id in ids[-self.size:]:
+            self.add(update_id)
+        self.high_water = max(self.high_water, high_water)
+        self.changed = False
+        return self
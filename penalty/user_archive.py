@@ -0,0 +1,209 @@
+"""
+Cold archive module for users moved out of the hot user store.
+
+Records are appended to ARCHIVE_FILE in zlib-compressed blocks of
+JSON lines. A sorted index of (user_id, block offset, status code) is
+kept in memory and saved to ARCHIVE_INDEX_FILE, so looking up or
+restoring one user reads and decompresses a single block, and status
+counts never touch the records.
+
+The index arrays are only ever replaced, never changed in place, so
+they can be read from a worker thread. Restored users are tombstoned
+until the next merge.
+"""
+import json
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from user_snapshot import OTHER_STATUS, STATUS_CODES
+
+ARCHIVE_FILE = "users_archive.dat"
+ARCHIVE_INDEX_FILE = "users_archive.idx"
+# Records compressed together; bigger blocks compress better, smaller restore faster
+ARCHIVE_BLOCK_SIZE = 256
+
+INDEX_MAGIC = b"USRARCH1"
+# magic, entry count
+INDEX_HEADER = struct.Struct("<8sQ")
+# compressed length, record count
+BLOCK_HEADER = struct.Struct("<II")
+
+
+class UserArchive:
+    """Archived users, looked up by user_id through a sorted in-memory index."""
+
+    def __init__(self, path: str = ARCHIVE_FILE, index_path: str = ARCHIVE_INDEX_FILE):
+        self.path = path
+        self.index_path = index_path
+        self.ids = array("q")
+        self.offsets = array("q")
+        self.statuses = array("B")
+        self.restored: Dict[int, int] = {}  # tombstones: user_id -> status code
+        self.dirty = False
+
+    def load(self) -> "UserArchive":
+        """Read the index, starting empty if there is none."""
+        try:
+            with open(self.index_path, "rb") as f:
+                magic, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC:
+                    raise ValueError(f"{self.index_path} is not a user archive index")
+                self.ids.fromfile(f, count)
+                self.offsets.fromfile(f, count)
+                self.statuses.fromfile(f, count)
+        except FileNotFoundError:
+            pass
+        return self
+
+    def save_index(self, arrays: Optional[Tuple[array, array, array]] = None, restored=frozenset()) -> None:
+        """Write the index (or the given merged arrays) without the restored user_ids, atomically."""
+        ids, offsets, statuses = arrays or (self.ids, self.offsets, self.statuses)
+        if restored:
+            keep = [i for i, user_id in enumerate(ids) if user_id not in restored]
+            ids = array("q", (ids[i] for i in keep))
+            offsets = array("q", (offsets[i] for i in keep))
+            statuses = array("B", (statuses[i] for i in keep))
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(ids)))
+            ids.tofile(f)
+            offsets.tofile(f)
+            statuses.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def __len__(self) -> int:
+        return len(self.ids) - len(self.restored)
+
+    def _position(self, user_id: int) -> int:
+        """Binary search the index, returning the entry position or -1."""
+        low, high = 0, len(self.ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self.ids[middle] < user_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self.ids) and self.ids[low] == user_id else -1
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id not in self.restored and self._position(user_id) >= 0
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Count archived users per status, plus the "total"."""
+        restored = Counter(self.restored.values())
+        counts = {"total": len(self)}
+        for status, code in STATUS_CODES.items():
+            counts[status] = self.statuses.count(code) - restored[code]
+        return counts
+
+    def ids_with_status(self, status: str) -> List[int]:
+        """Get the archived user_ids with a status, from the index alone."""
+        code = STATUS_CODES[status]
+        return [user_id for user_id, status_code in zip(self.ids, self.statuses)
+                if status_code == code and user_id not in self.restored]
+
+    def _read_block(self, offset: int) -> List[Dict]:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            length, _ = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            data = zlib.decompress(f.read(length))
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    def capture(self) -> Tuple[array, array, frozenset]:
+        """Capture the index for iter_users() in another thread."""
+        return self.ids, self.offsets, frozenset(self.restored)
+
+    def iter_users(self, ids: array, offsets: array, restored=frozenset()) -> Iterator[Dict]:
+        """Read all users of a captured index, scanning the file block by block."""
+        if not ids:
+            return
+        end = max(offsets)
+        with open(self.path, "rb") as f:
+            offset = 0
+            while offset <= end:
+                f.seek(offset)
+                length, _ = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+                data = zlib.decompress(f.read(length))
+                for line in data.decode("utf-8").splitlines():
+                    user = json.loads(line)
+                    user_id = user.get("user_id")
+                    position = bisect_left(ids, user_id)
+                    # Skip superseded copies: only the indexed block of a user counts
+                    if (position < len(ids) and ids[position] == user_id and offsets[position] == offset
+                            and user_id not in restored):
+                        yield user
+                offset += BLOCK_HEADER.size + length
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        """Read an archived user without restoring it."""
+        position = self._position(user_id)
+        if position < 0 or user_id in self.restored:
+            return None
+        for user in self._read_block(self.offsets[position]):
+            if user.get("user_id") == user_id:
+                return user
+        return None
+
+    def remove(self, user_id: int) -> None:
+        """Tombstone a user that was restored (its block stays in the file)."""
+        position = self._position(user_id)
+        if position >= 0 and user_id not in self.restored:
+            self.restored[user_id] = self.statuses[position]
+            self.dirty = True
+
+    def write_blocks(self, users: Iterable[Dict]) -> List[Tuple[int, int, int]]:
+        """Append users to the archive file, returning their (user_id, offset, status code) entries.
+
+        The entries are not indexed until merged; blocks without entries
+        in the index are ignored.
+        """
+        entries = []
+        block = []
+        with open(self.path, "ab") as f:
+            def write_block():
+                data = zlib.compress("\n".join(json.dumps(user, ensure_ascii=False) for user in block).encode("utf-8"))
+                offset = f.tell()
+                f.write(BLOCK_HEADER.pack(len(data), len(block)))
+                f.write(data)
+                for user in block:
+                    entries.append((user["user_id"], offset, STATUS_CODES.get(user.get("status"), OTHER_STATUS)))
+                block.clear()
+
+            for user in users:
+                block.append(user)
+                if len(block) >= ARCHIVE_BLOCK_SIZE:
+                    write_block()
+            if block:
+                write_block()
+            f.flush()
+            os.fsync(f.fileno())
+        return entries
+
+    def merge(self, entries: Iterable[Tuple[int, int, int]], restored=frozenset()) -> Tuple[array, array, array]:
+        """Build new index arrays with the entries added and the restored user_ids left out.
+
+        A newer entry for a user_id replaces the older one. Can run in a
+        worker thread; apply the result with swap().
+        """
+        merged = {user_id: (offset, status) for user_id, offset, status in zip(self.ids, self.offsets, self.statuses)
+                  if user_id not in restored}
+        for user_id, offset, status in entries:
+            merged[user_id] = (offset, status)
+        ids = sorted(merged)
+        return (array("q", ids),
+                array("q", (merged[user_id][0] for user_id in ids)),
+                array("B", (merged[user_id][1] for user_id in ids)))
+
+    def swap(self, arrays: Tuple[array, array, array], restored=frozenset()) -> None:
+        """Switch to merged index arrays; tombstones merged away are dropped."""
+        self.ids, self.offsets, self.statuses = arrays
+        for user_id in restored:
+            self.restored.pop(user_id, None)
+        self.dirty = True
@@ -0,0 +1,108 @@
+"""
+User export module: stream subscribers to a CSV or NDJSON file.
+
+Users are read one at a time from a captured view of the store and
+written straight to disk, so memory does not grow with the population.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+
+CSV_FIELDS = ("user_id", "username", "first_name", "last_name", "status",
+              "first_seen", "last_seen", "interaction_count")
+
+
+class ExportOptions:
+    """What to export and how, parsed from /export arguments."""
+
+    def __init__(self, fmt: str = FORMAT_CSV, compress: bool = False, statuses: Optional[set] = None,
+                 since: Optional[str] = None, until: Optional[str] = None):
+        self.fmt = fmt
+        self.compress = compress
+        self.statuses = statuses
+        self.since = since
+        self.until = until
+
+    @classmethod
+    def parse(cls, args: Iterable[str]) -> "ExportOptions":
+        """Parse arguments like: ndjson gz status=active,muted since=2025-11-01 until=2025-12-01
+
+        Raises ValueError for unknown arguments or invalid dates.
+        """
+        options = cls()
+        for arg in args:
+            name, _, value = arg.lower().partition("=")
+            if not value and name in FORMATS:
+                options.fmt = name
+            elif not value and name in ("gz", "gzip"):
+                options.compress = True
+            elif name == "status" and value:
+                options.statuses = set(value.split(","))
+            elif name in ("since", "until") and value:
+                try:
+                    setattr(options, name, datetime.fromisoformat(value).isoformat())
+                except ValueError:
+                    raise ValueError(f"Invalid date for {name}: {value}")
+            else:
+                raise ValueError(f"Unknown argument: {arg}")
+        return options
+
+    @property
+    def file_name(self) -> str:
+        name = f"subscribers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{self.fmt}"
+        return name + ".gz" if self.compress else name
+
+    def matches(self, user: Dict) -> bool:
+        """Check a user against the status and last_seen filters."""
+        if self.statuses is not None and user.get("status") not in self.statuses:
+            return False
+        if self.since is not None or self.until is not None:
+            last_seen = user.get("last_seen")
+            if not isinstance(last_seen, str):
+                return False
+            if self.since is not None and last_seen < self.since:
+                return False
+            if self.until is not None and last_seen >= self.until:
+                return False
+        return True
+
+
+def filter_users(users: Iterable[Tuple[str, Dict]], options: ExportOptions) -> Iterator[Dict]:
+    """Yield the users that match the options."""
+    for _, user in users:
+        if options.matches(user):
+            yield user
+
+
+def write_export(users: Iterable[Tuple[str, Dict]], options: ExportOptions) -> Tuple[str, int]:
+    """Write matching users to a temporary file. Returns (path, user count); the caller removes the file."""
+    fd, path = tempfile.mkstemp(prefix="export_", suffix="." + options.fmt)
+    count = 0
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            binary = gzip.GzipFile(fileobj=raw, mode="wb") if options.compress else raw
+            with io.TextIOWrapper(binary, encoding="utf-8", newline="") as f:
+                if options.fmt == FORMAT_CSV:
+                    writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+                    writer.writeheader()
+                    for user in filter_users(users, options):
+                        writer.writerow(user)
+                        count += 1
+                else:
+                    for user in filter_users(users, options):
+                        f.write(json.dumps(user, ensure_ascii=False))
+                        f.write("\n")
+                        count += 1
+    except Exception:
+        os.remove(path)
+        raise
+    return path, count
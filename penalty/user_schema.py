@@ -0,0 +1,67 @@
+"""
+User record schema versions and the migrations between them.
+
+Each record carries its "schema_version"; records without one are
+version 1 (the original layout). upgrade() brings any record to
+SCHEMA_VERSION one step at a time, so a layout change is a new entry in
+MIGRATIONS instead of a rewrite of every reader.
+
+Version 2: every standard field is present, in a fixed order, with
+interaction_count an int.
+"""
+from typing import Callable, Dict
+
+SCHEMA_VERSION = 2
+
+# Standard fields in record order, with the value used when one is missing or null
+STANDARD_FIELDS = (
+    ("user_id", None),
+    ("username", None),
+    ("first_name", None),
+    ("last_name", None),
+    ("status", "active"),
+    ("first_seen", None),
+    ("last_seen", None),
+    ("interaction_count", 0)
+)
+
+
+def record_version(user: Dict) -> int:
+    """Get the schema version of a record."""
+    return user.get("schema_version", 1)
+
+
+def _v1_to_v2(user: Dict) -> Dict:
+    upgraded = {}
+    for field, default in STANDARD_FIELDS:
+        value = user.get(field)
+        upgraded[field] = default if value is None else value
+    try:
+        upgraded["interaction_count"] = int(upgraded["interaction_count"] or 0)
+    except (TypeError, ValueError):
+        upgraded["interaction_count"] = 0
+    upgraded["schema_version"] = 2
+    for field, value in user.items():
+        if field not in upgraded:
+            upgraded[field] = value
+    return upgraded
+
+
+# version -> function upgrading a record of that version to the next one
+MIGRATIONS: Dict[int, Callable[[Dict], Dict]] = {
+    1: _v1_to_v2
+}
+
+
+def upgrade(user: Dict) -> Dict:
+    """Bring a record to SCHEMA_VERSION, returning it unchanged if it already is.
+
+    Raises ValueError for records from a newer schema than this code knows.
+    """
+    version = record_version(user)
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"User record has schema version {version}, newer than {SCHEMA_VERSION}")
+    while version < SCHEMA_VERSION:
+        user = MIGRATIONS[version](user)
+        version = record_version(user)
+    return user
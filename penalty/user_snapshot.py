@@ -0,0 +1,271 @@
+"""
+Binary snapshot module for fast cold starts of the user store.
+
+A snapshot mirrors users_data.json as fixed-width records plus a blob of
+UTF-8 strings, and a sorted (user_id, record) index for binary search.
+It is memory-mapped, so opening it costs the same for 10 or 10M users and
+records are only decoded when they are read.
+
+Layout: header | records (JSON order) | index (sorted by user_id) | blob
+"""
+import json
+import mmap
+import os
+import struct
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"USRSNAP1"
+VERSION = 2
+
+# magic, version, json size, json mtime_ns, record count, index offset, blob offset
+HEADER = struct.Struct("<8sIqqQQQ")
+# user_id, status code, schema version (0 if absent), interaction_count, first_seen,
+# last_seen, then (offset, length) into the blob for username, first_name, last_name, extras
+RECORD = struct.Struct("<qBB2xIqq" + "QI" * 4)
+INDEX = struct.Struct("<qI")
+# Position of the status code within a record
+STATUS_OFFSET = 8
+
+# Same values as the STATUS_* constants in user_tracker
+STATUS_CODES = {"active": 0, "muted": 1, "deleted": 2, "blocked": 3}
+STATUS_NAMES = {code: status for status, code in STATUS_CODES.items()}
+OTHER_STATUS = 255
+
+STANDARD_FIELDS = ("user_id", "username", "first_name", "last_name", "status",
+                   "first_seen", "last_seen", "interaction_count", "schema_version")
+NAME_FIELDS = ("username", "first_name", "last_name")
+NO_STRING = 0xFFFFFFFF
+NO_TIME = -2 ** 63
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _time_to_us(value) -> Optional[int]:
+    """Convert a naive ISO timestamp to microseconds, or None if it would not round-trip."""
+    if value is None:
+        return NO_TIME
+    if not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None or dt.isoformat() != value:
+        return None
+    return (dt - EPOCH) // MICROSECOND
+
+
+def _us_to_time(value: int) -> Optional[str]:
+    """Convert microseconds back to the ISO timestamp."""
+    if value == NO_TIME:
+        return None
+    return (EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def _encode_record(key: str, user: Dict, blob: bytearray) -> Tuple[int, bytes]:
+    """Encode a user record; values that don't fit the fixed layout go to extras."""
+    user_id = user.get("user_id")
+    if not isinstance(user_id, int) or isinstance(user_id, bool) or str(user_id) != key:
+        raise ValueError(f"User key {key!r} does not match its user_id")
+
+    extras = {field: value for field, value in user.items() if field not in STANDARD_FIELDS}
+
+    status = user.get("status")
+    status_code = STATUS_CODES.get(status, OTHER_STATUS)
+    if status_code == OTHER_STATUS:
+        extras["status"] = status
+
+    schema_version = user.get("schema_version", 0)
+    if not isinstance(schema_version, int) or isinstance(schema_version, bool) or not 0 < schema_version < 256:
+        if "schema_version" in user:
+            extras["schema_version"] = schema_version
+        schema_version = 0
+
+    count = user.get("interaction_count", 0)
+    if not isinstance(count, int) or isinstance(count, bool) or not 0 <= count < 2 ** 32:
+        extras["interaction_count"] = count
+        count = 0
+
+    times = []
+    for field in ("first_seen", "last_seen"):
+        value = _time_to_us(user.get(field))
+        if value is None:
+            extras[field] = user.get(field)
+            value = NO_TIME
+        times.append(value)
+
+    strings = []
+    for field in NAME_FIELDS:
+        value = user.get(field)
+        if value is not None and not isinstance(value, str):
+            extras[field] = value
+            value = None
+        strings.append(value)
+    strings.append(json.dumps(extras, ensure_ascii=False) if extras else None)
+
+    refs = []
+    for value in strings:
+        if value is None:
+            refs.extend((0, NO_STRING))
+        else:
+            data = value.encode("utf-8")
+            refs.extend((len(blob), len(data)))
+            blob.extend(data)
+
+    return user_id, RECORD.pack(user_id, status_code, schema_version, count, times[0], times[1], *refs)
+
+
+def write_snapshot(path: str, users: Iterable[Tuple[str, Dict]], json_size: int, json_mtime_ns: int) -> int:
+    """Write a snapshot of (key, user) pairs for a JSON file with the given stat.
+
+    Raises ValueError if a record can't be represented. Returns the record count.
+    """
+    records = []
+    index = []
+    blob = bytearray()
+    for position, (key, user) in enumerate(users):
+        user_id, record = _encode_record(key, user, blob)
+        records.append(record)
+        index.append((user_id, position))
+    index.sort()
+
+    index_offset = HEADER.size + len(records) * RECORD.size
+    blob_offset = index_offset + len(index) * INDEX.size
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, json_size, json_mtime_ns, len(records), index_offset, blob_offset))
+        f.write(b"".join(records))
+        f.write(b"".join(INDEX.pack(user_id, position) for user_id, position in index))
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class UserSnapshot:
+    """Read-only, memory-mapped view of a snapshot, keyed like users_data.json."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.json_size, self.json_mtime_ns,
+             self._count, self._index_offset, self._blob_offset) = HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            self.close()
+            raise ValueError("Snapshot is truncated")
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Not a user snapshot or unsupported version")
+
+    @classmethod
+    def open_for(cls, path: str, json_path: str) -> Optional["UserSnapshot"]:
+        """Open the snapshot if it exists and matches the current JSON file."""
+        try:
+            stat = os.stat(json_path)
+            snapshot = cls(path)
+        except (OSError, ValueError):
+            return None
+        if (snapshot.json_size, snapshot.json_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            snapshot.close()
+            return None
+        return snapshot
+
+    def close(self) -> None:
+        """Unmap the file."""
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _find(self, user_id: int) -> int:
+        """Binary search the index, returning the record position or -1."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            found_id, position = INDEX.unpack_from(self._mm, self._index_offset + middle * INDEX.size)
+            if found_id == user_id:
+                return position
+            if found_id < user_id:
+                low = middle + 1
+            else:
+                high = middle
+        return -1
+
+    def _position(self, key) -> int:
+        """Get the record position for a users_data.json key."""
+        try:
+            return self._find(int(key))
+        except (TypeError, ValueError):
+            return -1
+
+    def _string(self, offset: int, length: int) -> Optional[str]:
+        if length == NO_STRING:
+            return None
+        start = self._blob_offset + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _decode(self, position: int) -> Dict:
+        """Decode the record at a position into a fresh dict."""
+        fields = RECORD.unpack_from(self._mm, HEADER.size + position * RECORD.size)
+        user_id, status_code, schema_version, count, first_seen, last_seen = fields[:6]
+        refs = fields[6:]
+        username, first_name, last_name, extras = (
+            self._string(refs[i], refs[i + 1]) for i in range(0, 8, 2)
+        )
+        user = {
+            "user_id": user_id,
+            "username": username,
+            "first_name": first_name,
+            "last_name": last_name,
+            "status": STATUS_NAMES.get(status_code),
+            "first_seen": _us_to_time(first_seen),
+            "last_seen": _us_to_time(last_seen),
+            "interaction_count": count
+        }
+        if schema_version:
+            user["schema_version"] = schema_version
+        if extras:
+            user.update(json.loads(extras))
+        return user
+
+    def __contains__(self, key) -> bool:
+        return self._position(key) >= 0
+
+    def get(self, key, default=None) -> Optional[Dict]:
+        """Get a decoded copy of the record for a key."""
+        position = self._position(key)
+        return self._decode(position) if position >= 0 else default
+
+    def keys(self) -> Iterator[str]:
+        """Iterate keys in JSON order."""
+        for position in range(self._count):
+            user_id = struct.unpack_from("<q", self._mm, HEADER.size + position * RECORD.size)[0]
+            yield str(user_id)
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """Iterate (key, record) pairs in JSON order."""
+        for position in range(self._count):
+            user = self._decode(position)
+            yield str(user["user_id"]), user
+
+    def values(self) -> Iterator[Dict]:
+        """Iterate records in JSON order."""
+        for position in range(self._count):
+            yield self._decode(position)
+
+    def ids_with_status(self, status: str) -> List[int]:
+        """Get the user_ids with a status, reading only the fixed-width fields."""
+        status_code = STATUS_CODES[status]
+        with memoryview(self._mm) as view:
+            records = view[HEADER.size:HEADER.size + self._count * RECORD.size]
+            try:
+                return [fields[0] for fields in RECORD.iter_unpack(records) if fields[1] == status_code]
+            finally:
+                records.release()
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Count users per known status from the status bytes alone (one strided copy)."""
+        start = HEADER.size + STATUS_OFFSET
+        codes = self._mm[start:HEADER.size + self._count * RECORD.size:RECORD.size]
+        return {status: codes.count(code) for status, code in STATUS_CODES.items()}
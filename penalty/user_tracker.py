@@ -1,12 +1,39 @@
 """
 User tracking module for storing and managing bot subscribers.
 """
+import asyncio
+import atexit
 import json
+import logging
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from blocklist import Blocklist
+from search_index import SearchIndex
+from tracing import traced
+from update_ledger import UpdateLedger, UPDATE_LEDGER_FILE
+from user_archive import UserArchive
+from user_schema import SCHEMA_VERSION, upgrade
+from user_snapshot import UserSnapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
 
 USER_DATA_FILE = "users_data.json"
+# Binary copy of USER_DATA_FILE used for fast cold starts
+USER_SNAPSHOT_FILE = "users_data.snap"
+# Seconds between background flushes once write-behind is started
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "5"))
+# Users not seen for this many days are moved to the cold archive (0 = never).
+# Archived users are left out of /subscribers lists and broadcasts until they come back.
+ARCHIVE_INACTIVE_DAYS = float(os.getenv("ARCHIVE_INACTIVE_DAYS", "0"))
+# Move deleted users to the cold archive too (then /sendtothem all skips them)
+ARCHIVE_DELETED = os.getenv("ARCHIVE_DELETED", "0") == "1"
+# Seconds between archive runs (the first one starts a minute after startup)
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", str(6 * 3600)))
 
 # User statuses
 STATUS_ACTIVE = "active"
@@ -15,31 +42,520 @@ STATUS_DELETED = "deleted"
 STATUS_BLOCKED = "blocked"
 
 
-def load_users() -> Dict:
-    """Load user data from JSON file."""
-    if os.path.exists(USER_DATA_FILE):
-        try:
-            with open(USER_DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
+def _read_json(path: str) -> Dict:
+    """Read a users JSON file, returning {} if it's missing or empty.
+
+    Raises ValueError for a damaged file instead of starting with no
+    users, which the next save would write over it.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        if not text.strip():
             return {}
-    return {}
+        users = json.loads(text)
+    except (ValueError, OSError) as e:
+        raise ValueError(f"{path} is damaged ({e}). Recover the intact users with "
+                         f"'python salvage_users.py {path}' or restore a backup, then restart.") from e
+    if not isinstance(users, dict) or not all(isinstance(user, dict) for user in users.values()):
+        raise ValueError(f"{path} is not a users file (expected an object of user records)")
+    return users
+
+
+def dump_users_json(users: Iterator[Tuple[str, Dict]], f) -> int:
+    """Stream users to a text file (same layout as json.dump with indent=2). Returns the user count."""
+    count = 0
+    for key, user in users:
+        f.write(",\n  " if count else "{\n  ")
+        count += 1
+        f.write(json.dumps(key, ensure_ascii=False))
+        f.write(": ")
+        f.write(json.dumps(user, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+    f.write("\n}" if count else "{}")
+    return count
+
+
+def _write_json(path: str, users: Iterator[Tuple[str, Dict]]) -> None:
+    """Stream users to a JSON file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        dump_users_json(users, f)
+    os.replace(tmp_path, path)
+
+
+class UserStore(MutableMapping):
+    """Users keyed by str(user_id), persisted to USER_DATA_FILE.
+
+    The data is loaded on first use, from the binary snapshot when it
+    matches the JSON file (no parsing, so it takes the same time for any
+    number of users) and from the JSON otherwise. Loaded data is never
+    modified: store[key] hands out a private copy of the record that is
+    written back on the next flush, upgraded to the current schema.
+    values() and items() are read-only and return records as stored.
+    """
+
+    def __init__(self, path: str = USER_DATA_FILE, snapshot_path: str = USER_SNAPSHOT_FILE,
+                 ledger_path: str = UPDATE_LEDGER_FILE):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.ledger_path = ledger_path
+        self.write_behind = False
+        self.load_seconds: Optional[float] = None
+        self._base = None  # UserSnapshot or dict, read-only
+        self._changes: Dict[str, Dict] = {}  # records handed out or added since loading
+        self._added: List[str] = []  # keys not in the base, in insertion order
+        self._removed = set()
+        self._dirty = set()
+        self._flushed: Dict[str, Dict] = {}  # copies of changed records as of the last flush
+        self._pending = False  # something to write, even with no dirty keys
+        self._flushing = False
+        self._flush_seq = 0
+        self._written_seq = 0
+        self._write_lock = threading.Lock()
+        self._blocklist: Optional[Blocklist] = None
+        self._search_index: Optional[SearchIndex] = None
+        self._updates: Optional[UpdateLedger] = None
+        self.archive: Optional[UserArchive] = None  # archived users count towards the blocklist
+
+    def load(self):
+        """Load the base data if it isn't loaded yet."""
+        if self._base is None:
+            start = perf_counter()
+            base = UserSnapshot.open_for(self.snapshot_path, self.path)
+            if base is None:
+                base = _read_json(self.path)
+                # Write a snapshot for the next start
+                self._pending = os.path.exists(self.path)
+            self._base = base
+            self.load_seconds = perf_counter() - start
+        return self._base
+
+    def replace(self, users_data: Dict) -> None:
+        """Replace all users with the given dict."""
+        self._base = dict(users_data)
+        self._changes = {}
+        self._added = []
+        self._removed = set()
+        self._dirty = set()
+        self._flushed = {}
+        self._pending = True
+        self._blocklist = None
+        self._search_index = None
+
+    def mark_changed(self) -> None:
+        """Make the next flush write even if no record was handed out."""
+        self._pending = True
+
+    def __getitem__(self, key: str) -> Dict:
+        user = self._changes.get(key)
+        if user is None:
+            if key in self._removed:
+                raise KeyError(key)
+            user = self.load().get(key)
+            if user is None:
+                raise KeyError(key)
+            user = upgrade(dict(user))
+            self._changes[key] = user
+        self._dirty.add(key)
+        return user
+
+    def __setitem__(self, key: str, user: Dict) -> None:
+        if key not in self:
+            if key in self._removed:
+                self._removed.discard(key)
+            if key not in self._base and key not in self._added:
+                self._added.append(key)
+        self._changes[key] = user
+        self._dirty.add(key)
+        if self._blocklist is not None and isinstance(user.get("user_id"), int):
+            self._blocklist.update(user["user_id"], user.get("status"))
+        if self._search_index is not None:
+            self._search_index.update(user)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._changes.pop(key, None)
+        self._removed.add(key)
+        self._dirty.add(key)
+        if self._blocklist is not None:
+            self._blocklist.update(int(key), None)
+        if self._search_index is not None:
+            self._search_index.remove(int(key))
+
+    def peek(self, key: str) -> Optional[Dict]:
+        """Get a record without handing it out for changes; it must not be modified."""
+        user = self._changes.get(key)
+        if user is None and key not in self._removed:
+            user = self.load().get(key)
+        return user
+
+    def reindex(self, key: str) -> None:
+        """Update the search index after a record's names were changed in place."""
+        if self._search_index is not None and key in self._changes:
+            self._search_index.update(self._changes[key])
+
+    def __contains__(self, key) -> bool:
+        if key in self._changes:
+            return True
+        return key not in self._removed and key in self.load()
+
+    def __len__(self) -> int:
+        base = self.load()
+        return len(base) + len(self._added) - len(self._removed)
+
+    def __iter__(self) -> Iterator[str]:
+        for key, _ in self.items():
+            yield key
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """Iterate (key, record) pairs; records must not be modified."""
+        base = self.load()
+        changes = self._changes
+        removed = self._removed
+        for key, user in base.items():
+            if key not in removed:
+                yield key, changes.get(key, user)
+        for key in list(self._added):
+            if key not in removed:
+                yield key, changes[key]
+
+    def values(self) -> Iterator[Dict]:
+        """Iterate records; records must not be modified."""
+        for _, user in self.items():
+            yield user
+
+    def capture(self) -> Tuple:
+        """Capture the current state as (base, changes, added, removed); only changed records are copied."""
+        changes = {key: dict(user) for key, user in self._changes.items()}
+        return self.load(), changes, list(self._added), frozenset(self._removed)
+
+    def view(self) -> Iterator[Tuple[str, Dict]]:
+        """Capture the current users for reading in another thread, in JSON order."""
+        return self._iter_state(*self.capture())
+
+    def ids_with_status(self, status: str) -> List[int]:
+        """Get the user_ids with a status (from fixed-width fields when using the snapshot)."""
+        base = self.load()
+        if isinstance(base, UserSnapshot):
+            ids = set(base.ids_with_status(status))
+        else:
+            ids = {user.get("user_id") for user in base.values() if user.get("status") == status}
+        for key in self._removed:
+            ids.discard(int(key))
+        for user in self._changes.values():
+            if user.get("status") == status:
+                ids.add(user.get("user_id"))
+            else:
+                ids.discard(user.get("user_id"))
+        return [user_id for user_id in ids if isinstance(user_id, int)]
+
+    @property
+    def blocklist(self) -> Blocklist:
+        """Blocked and muted user IDs (archived ones included), built on first use."""
+        if self._blocklist is None:
+            blocked = self.ids_with_status(STATUS_BLOCKED)
+            muted = self.ids_with_status(STATUS_MUTED)
+            if self.archive is not None:
+                blocked += self.archive.ids_with_status(STATUS_BLOCKED)
+                muted += self.archive.ids_with_status(STATUS_MUTED)
+            self._blocklist = Blocklist(blocked, muted)
+        return self._blocklist
+
+    @property
+    def search_index(self) -> SearchIndex:
+        """Name search over the users; built by SearchIndex.ensure_built(store.view)."""
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+        return self._search_index
+
+    @property
+    def updates(self) -> UpdateLedger:
+        """The update_ids already handled, saved with every flush."""
+        if self._updates is None:
+            self._updates = UpdateLedger().load(self.ledger_path)
+        return self._updates
+
+    @property
+    def next_flush_seq(self) -> int:
+        """Sequence number of the flush that will write the current changes."""
+        return self._flush_seq + 1
+
+    @property
+    def written_seq(self) -> int:
+        """Sequence number of the last flush written to disk."""
+        return self._written_seq
+
+    def _prepare_flush(self):
+        """Capture what to write. Must run on the thread that modifies the store."""
+        ledger = self._updates.dump() if self._updates is not None else None
+        if not self._dirty and not self._pending and ledger is None:
+            return None
+        flushed = dict(self._flushed)
+        for key in self._dirty:
+            if key in self._changes:
+                flushed[key] = dict(self._changes[key])
+            else:
+                flushed.pop(key, None)
+        self._flushed = flushed
+        self._dirty = set()
+        self._pending = False
+        self._flush_seq += 1
+        return self._flush_seq, ledger, self.load(), flushed, list(self._added), frozenset(self._removed)
+
+    @staticmethod
+    def _iter_state(base, flushed: Dict, added: List[str], removed) -> Iterator[Tuple[str, Dict]]:
+        """Iterate a captured state in JSON order."""
+        for key, user in base.items():
+            if key not in removed:
+                yield key, flushed.get(key, user)
+        for key in added:
+            if key not in removed:
+                yield key, flushed[key]
+
+    def _write(self, state) -> None:
+        """Write a captured state to the JSON file and the snapshot."""
+        seq, ledger, *view = state
+        with self._write_lock:
+            if seq <= self._written_seq:
+                return  # a newer state was already written
+            if ledger is not None:
+                # Before the users: after a crash in between, an update is skipped rather than counted twice
+                UpdateLedger.write(self.ledger_path, ledger)
+            _write_json(self.path, self._iter_state(*view))
+            self._written_seq = seq
+            stat = os.stat(self.path)
+            try:
+                write_snapshot(self.snapshot_path, self._iter_state(*view), stat.st_size, stat.st_mtime_ns)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not write user snapshot: {e}")
+
+    def _retry_later(self) -> None:
+        """Make the next flush write everything again after a failed write."""
+        self._pending = True
+        if self._updates is not None:
+            self._updates.changed = True
+
+    def flush(self) -> None:
+        """Write pending changes now."""
+        state = self._prepare_flush()
+        if state is not None:
+            try:
+                self._write(state)
+            except Exception:
+                self._retry_later()
+                raise
+
+    async def flush_async(self) -> None:
+        """Write pending changes in a worker thread."""
+        if self._flushing:
+            return
+        state = self._prepare_flush()
+        if state is None:
+            return
+        self._flushing = True
+        try:
+            await asyncio.to_thread(self._write, state)
+        except Exception:
+            self._retry_later()
+            raise
+        finally:
+            self._flushing = False
+
+
+_store: Optional[UserStore] = None
+
+
+def get_store() -> UserStore:
+    """Get the process-wide user store."""
+    global _store
+    if _store is None:
+        _store = UserStore()
+        _store.archive = get_archive()
+        atexit.register(_store.flush)
+    return _store
+
+
+async def run_write_behind(interval: float = USER_FLUSH_INTERVAL) -> None:
+    """Flush the store every interval instead of on every save_users call."""
+    store = get_store()
+    store.write_behind = True
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await store.flush_async()
+            except Exception as e:
+                logger.error(f"Error flushing users: {e}")
+    finally:
+        store.write_behind = False
+
+
+_archive: Optional[UserArchive] = None
+# Restored user_id -> the store flush that writes it back
+_restore_flushes: Dict[int, int] = {}
+
+
+def get_archive() -> UserArchive:
+    """Get the cold archive, reading its index on first use."""
+    global _archive
+    if _archive is None:
+        _archive = UserArchive().load()
+    return _archive
+
+
+def durable_restores() -> frozenset:
+    """Get the restored user_ids whose record a store flush has written.
+
+    Only these may be left out of a saved archive index; the others are
+    still only in memory, and leaving them out too would lose them in a
+    crash before the next flush.
+    """
+    archive = get_archive()
+    written_seq = get_store().written_seq
+    for user_id in [user_id for user_id in _restore_flushes if user_id not in archive.restored]:
+        del _restore_flushes[user_id]
+    return frozenset(user_id for user_id in archive.restored if _restore_flushes.get(user_id, 0) <= written_seq)
+
+
+def capture_all_users() -> Iterator[Tuple[str, Dict]]:
+    """Capture the store and the cold archive together for reading in another thread.
+
+    Must run on the event loop. Users that are in both (while being
+    archived) are read from the store.
+    """
+    base, changes, added, removed = get_store().capture()
+    archive = get_archive()
+    archived = archive.capture()
+
+    def iterate():
+        yield from UserStore._iter_state(base, changes, added, removed)
+        for user in archive.iter_users(*archived):
+            key = str(user["user_id"])
+            if key in removed or not (key in changes or key in base):
+                yield key, user
+
+    return iterate()
+
+
+def _is_cold(user: Dict, cutoff: Optional[str]) -> bool:
+    """Check if a user belongs in the cold archive."""
+    if ARCHIVE_DELETED and user.get("status") == STATUS_DELETED:
+        return True
+    last_seen = user.get("last_seen")
+    return cutoff is not None and isinstance(last_seen, str) and last_seen < cutoff
+
+
+async def archive_cold_users() -> int:
+    """Move cold users from the store to the archive. Returns how many were moved.
+
+    The archive index is saved before the users leave the store, so a
+    crash in between can leave a user in both (the store wins) but never
+    in neither.
+    """
+    cutoff = (datetime.now() - timedelta(days=ARCHIVE_INACTIVE_DAYS)).isoformat() if ARCHIVE_INACTIVE_DAYS > 0 else None
+    if cutoff is None and not ARCHIVE_DELETED:
+        return 0
+    store = get_store()
+    archive = get_archive()
+    view = store.view()
+    restored = durable_restores()
+    
+    def write_and_index():
+        entries = archive.write_blocks(
+            user for _, user in view if _is_cold(user, cutoff) and isinstance(user.get("user_id"), int)
+        )
+        if not entries:
+            return entries, None
+        arrays = archive.merge(entries, restored)
+        archive.save_index(arrays)
+        return entries, arrays
+    
+    entries, arrays = await asyncio.to_thread(write_and_index)
+    if not entries:
+        return 0
+    
+    # Back on the event loop: users that came back meanwhile stay in the store
+    archive.swap(arrays, restored)
+    moved = 0
+    for user_id, _, _ in entries:
+        key = str(user_id)
+        user = store.peek(key)
+        if user is not None and _is_cold(user, cutoff):
+            del store[key]
+            # Archived blocked and muted users stay in the blocklist
+            store.blocklist.update(user_id, user.get("status"))
+            moved += 1
+        else:
+            archive.remove(user_id)
+    logger.info(f"Archived {moved} users ({len(archive)} in the archive)")
+    return moved
+
+
+async def run_archiver(interval: float = ARCHIVE_INTERVAL) -> None:
+    """Archive cold users every interval and save the archive index after restores."""
+    archive = get_archive()
+    next_run = asyncio.get_running_loop().time() + min(60, interval)
+    while True:
+        await asyncio.sleep(USER_FLUSH_INTERVAL)
+        try:
+            if asyncio.get_running_loop().time() >= next_run:
+                next_run += interval
+                await archive_cold_users()
+            if archive.dirty:
+                restored = durable_restores()
+                # Save again on a later tick once the store has written the other restores
+                archive.dirty = len(restored) < len(archive.restored)
+                await asyncio.to_thread(archive.save_index, None, restored)
+        except Exception as e:
+            archive.dirty = True
+            logger.error(f"Error archiving users: {e}")
+
+
+@traced("archive.restore")
+def _restore_archived(users_data: UserStore, user_id: int) -> bool:
+    """Move a user back from the archive to the store, if archived."""
+    archive = get_archive()
+    if user_id not in archive:
+        return False
+    user = archive.get(user_id)
+    if user is None:
+        return False
+    users_data[str(user_id)] = user
+    archive.remove(user_id)
+    _restore_flushes[user_id] = users_data.next_flush_seq
+    logger.info(f"Restored user {user_id} from the archive")
+    return True
+
+
+def load_users() -> UserStore:
+    """Load user data (from the snapshot or JSON file on first use)."""
+    store = get_store()
+    store.load()
+    return store
 
 
 def save_users(users_data: Dict) -> None:
-    """Save user data to JSON file."""
-    with open(USER_DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users_data, f, indent=2, ensure_ascii=False)
+    """Save user data to JSON file (batched when write-behind is running)."""
+    store = get_store()
+    if users_data is not store:
+        store.replace(users_data)
+    store.mark_changed()
+    if not store.write_behind:
+        store.flush()
 
 
+@traced("store.track_user")
 def track_user(user_id: int, username: Optional[str], first_name: Optional[str], 
-               last_name: Optional[str] = None) -> None:
-    """Track or update user information."""
+               last_name: Optional[str] = None, count: int = 1, seen_at: Optional[str] = None) -> None:
+    """Track or update user information (count interactions, the last one at seen_at, default now)."""
     users_data = load_users()
     user_id_str = str(user_id)
-    current_time = datetime.now().isoformat()
+    current_time = seen_at or datetime.now().isoformat()
     
-    if user_id_str not in users_data:
+    if user_id_str not in users_data and not _restore_archived(users_data, user_id):
         # New user
         users_data[user_id_str] = {
             "user_id": user_id,
@@ -49,44 +565,79 @@ def track_user(user_id: int, username: Optional[str], first_name: Optional[str],
             "status": STATUS_ACTIVE,
             "first_seen": current_time,
             "last_seen": current_time,
-            "interaction_count": 1
+            "interaction_count": count,
+            "schema_version": SCHEMA_VERSION
         }
     else:
         # Update existing user
         users_data[user_id_str]["last_seen"] = current_time
-        users_data[user_id_str]["interaction_count"] = users_data[user_id_str].get("interaction_count", 0) + 1
+        users_data[user_id_str]["interaction_count"] = users_data[user_id_str].get("interaction_count", 0) + count
         # Update name if changed
+        user = users_data[user_id_str]
+        names = (user.get("username"), user.get("first_name"), user.get("last_name"))
         if username:
-            users_data[user_id_str]["username"] = username
+            user["username"] = username
         if first_name:
-            users_data[user_id_str]["first_name"] = first_name
+            user["first_name"] = first_name
         if last_name:
-            users_data[user_id_str]["last_name"] = last_name
+            user["last_name"] = last_name
+        if names != (user.get("username"), user.get("first_name"), user.get("last_name")):
+            users_data.reindex(user_id_str)
     
     save_users(users_data)
 
 
+class PendingTrack:
+    """Interactions of one user not written yet, applied later by a single track_user call."""
+    __slots__ = ("user_id", "username", "first_name", "last_name", "count", "seen_at")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.username = self.first_name = self.last_name = None
+        self.count = 0
+        self.seen_at: Optional[str] = None
+
+    def add(self, username: Optional[str], first_name: Optional[str], last_name: Optional[str]) -> None:
+        """Count an interaction now, keeping the latest names."""
+        self.username = username or self.username
+        self.first_name = first_name or self.first_name
+        self.last_name = last_name or self.last_name
+        self.count += 1
+        self.seen_at = datetime.now().isoformat()
+
+    def __call__(self) -> None:
+        track_user(self.user_id, self.username, self.first_name, self.last_name,
+                   count=self.count, seen_at=self.seen_at)
+
+
+@traced("store.get_user_status")
 def get_user_status(user_id: int) -> str:
     """Get user status."""
     users_data = load_users()
     user_id_str = str(user_id)
     if user_id_str in users_data:
         return users_data[user_id_str].get("status", STATUS_ACTIVE)
+    archived = get_archive().get(user_id)
+    if archived is not None:
+        return archived.get("status", STATUS_ACTIVE)
     return STATUS_ACTIVE
 
 
+@traced("store.set_user_status")
 def set_user_status(user_id: int, status: str) -> bool:
     """Set user status (active, muted, deleted, blocked)."""
     users_data = load_users()
     user_id_str = str(user_id)
     
-    if user_id_str in users_data:
+    if user_id_str in users_data or _restore_archived(users_data, user_id):
         users_data[user_id_str]["status"] = status
+        users_data.blocklist.update(user_id, status)
         save_users(users_data)
         return True
     return False
 
 
+@traced("store.get_all_users")
 def get_all_users() -> List[Dict]:
     """Get all users as a list."""
     users_data = load_users()
@@ -99,6 +650,7 @@ def get_users_by_status(status: str) -> List[Dict]:
     return [user for user in all_users if user.get("status") == status]
 
 
+@traced("store.get_user_count")
 def get_user_count() -> Dict[str, int]:
     """Get count of users by status."""
     all_users = get_all_users()
@@ -115,6 +667,10 @@ def get_user_count() -> Dict[str, int]:
         if status in counts:
             counts[status] += 1
     
+    # Archived users still count
+    for status, count in get_archive().count_by_status().items():
+        counts[status] += count
+    
     return counts
 
 
@@ -148,6 +704,7 @@ def get_status_emoji(status: str) -> str:
     return status_emojis.get(status, "❓")
 
 
+@traced("store.add_user_by_id")
 def add_user_by_id(user_id: int, username: Optional[str] = None, 
                    first_name: Optional[str] = None, last_name: Optional[str] = None) -> bool:
     """Add a user by ID (for importing existing users)."""
@@ -155,7 +712,7 @@ def add_user_by_id(user_id: int, username: Optional[str] = None,
     user_id_str = str(user_id)
     current_time = datetime.now().isoformat()
     
-    if user_id_str not in users_data:
+    if user_id_str not in users_data and user_id not in get_archive():
         # Add new user
         users_data[user_id_str] = {
             "user_id": user_id,
@@ -166,6 +723,7 @@ def add_user_by_id(user_id: int, username: Optional[str] = None,
             "first_seen": current_time,
             "last_seen": current_time,
             "interaction_count": 0,
+            "schema_version": SCHEMA_VERSION,
             "imported": True  # Mark as imported
         }
         save_users(users_data)
@@ -173,6 +731,7 @@ def add_user_by_id(user_id: int, username: Optional[str] = None,
     return False  # User already exists
 
 
+@traced("store.import_users")
 def import_users_from_list(user_ids: List[int]) -> Dict[str, int]:
     """Import multiple users from a list of user IDs.
     Returns dict with counts: {'added': X, 'skipped': Y, 'total': Z}
@@ -182,9 +741,11 @@ def import_users_from_list(user_ids: List[int]) -> Dict[str, int]:
     added = 0
     skipped = 0
     
+    archive = get_archive()
+    
     for user_id in user_ids:
         user_id_str = str(user_id)
-        if user_id_str not in users_data:
+        if user_id_str not in users_data and user_id not in archive:
             users_data[user_id_str] = {
                 "user_id": user_id,
                 "username": None,
@@ -194,6 +755,7 @@ def import_users_from_list(user_ids: List[int]) -> Dict[str, int]:
                 "first_seen": current_time,
                 "last_seen": current_time,
                 "interaction_count": 0,
+                "schema_version": SCHEMA_VERSION,
                 "imported": True
             }
             added += 1
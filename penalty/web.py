@@ -0,0 +1,270 @@
+"""Web process: liveness, readiness and metrics over HTTP, next to the bot worker.
+
+Runs as its own process (the Procfile "web" entry) and never polls
+Telegram, so platform health checks can't take updates away from the
+worker. It reads the user store, the archive index and the worker status file
+from the working directory, so it has to share that directory with the
+worker.
+
+Endpoints:
+    /healthz   200 while this process answers
+    /readyz    200 if the user snapshot reads and the Bot API answers getMe, else 503 (JSON details)
+    /metrics   the worker's metrics plus user counts, in the Prometheus text format
+
+Usage: python web.py (listens on PORT, default 8080)
+"""
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, time
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+from http_config import BOT_API_BASE_URL
+from user_archive import ARCHIVE_INDEX_FILE, UserArchive
+from user_snapshot import UserSnapshot
+from user_tracker import USER_DATA_FILE, USER_SNAPSHOT_FILE
+from worker_status import read_status, WORKER_STATUS_INTERVAL
+
+load_dotenv()
+logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PORT = int(os.getenv("PORT", "8080"))
+# Seconds a store check result is reused before looking at the snapshot again
+STORE_CHECK_INTERVAL = float(os.getenv("STORE_CHECK_INTERVAL", "30"))
+# Seconds a Bot API check result is reused before calling getMe again
+API_CHECK_INTERVAL = float(os.getenv("API_CHECK_INTERVAL", "30"))
+# Timeout of the getMe check
+API_CHECK_TIMEOUT = float(os.getenv("API_CHECK_TIMEOUT", "5"))
+# The worker counts as down once its status is this many seconds old
+WORKER_STALE_AFTER = 3 * WORKER_STATUS_INTERVAL
+
+
+class StoreCheck:
+    """Reports the user store from the worker's snapshot, never by parsing users_data.json.
+
+    Opening the snapshot is a memory map and counting reads only its
+    fixed-width fields, so a probe stays fast however many users there
+    are. Users moved to the cold archive are added from its saved index,
+    like the worker's own counts. The counts are read again at most every
+    STORE_CHECK_INTERVAL, and only if the snapshot or the index changed.
+    """
+
+    def __init__(self, path: str = USER_DATA_FILE, snapshot_path: str = USER_SNAPSHOT_FILE,
+                 archive_index_path: str = ARCHIVE_INDEX_FILE, interval: float = STORE_CHECK_INTERVAL):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.archive_index_path = archive_index_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._result: Dict = {}
+        self._snapshot_key = None
+        self._counts: Dict = {}
+        self._archive_key = None
+        self._archive_counts: Dict = {}
+
+    def check(self) -> Dict:
+        """Get {"ok", "state", ...} for the store, reading the snapshot if the last result is too old."""
+        with self._lock:
+            if time() - self._checked_at >= self.interval:
+                self._result = self._add_archived(self._check())
+                self._checked_at = time()
+            return self._result
+
+    def _add_archived(self, result: Dict) -> Dict:
+        if "users" not in result:
+            return result
+        archived = self._check_archive()
+        if "error" in archived:
+            result["archive_error"] = archived["error"]
+            return result
+        result["archived"] = archived["total"]
+        result["users"] += archived["total"]
+        if "statuses" in result:
+            result["statuses"] = {status: count + archived.get(status, 0)
+                                  for status, count in result["statuses"].items()}
+        return result
+
+    def _check_archive(self) -> Dict:
+        """Get the archived users per status (plus "total") from the saved index."""
+        try:
+            stat = os.stat(self.archive_index_path)
+        except FileNotFoundError:
+            return {"total": 0}
+        archive_key = (stat.st_size, stat.st_mtime_ns)
+        if archive_key != self._archive_key:
+            try:
+                self._archive_counts = UserArchive(index_path=self.archive_index_path).load().count_by_status()
+            except (OSError, ValueError, EOFError) as e:
+                self._archive_counts = {"error": str(e)}
+            self._archive_key = archive_key
+        return self._archive_counts
+
+    def _check(self) -> Dict:
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            if not os.path.exists(self.path):
+                return {"ok": True, "state": "missing", "users": 0}
+            # The worker writes a snapshot on its first flush after loading the JSON file
+            return {"ok": True, "state": "no snapshot"}
+        snapshot_key = (stat.st_size, stat.st_mtime_ns)
+        if snapshot_key != self._snapshot_key:
+            self._counts = self._read_counts()
+            self._snapshot_key = snapshot_key
+        result = dict(self._counts)
+        if result["ok"]:
+            # False between the worker's JSON and snapshot writes, or if it failed to write the snapshot
+            result["current"] = self._snapshot_is_current()
+        return result
+
+    def _read_counts(self) -> Dict:
+        start = perf_counter()
+        try:
+            snapshot = UserSnapshot(self.snapshot_path)
+        except (OSError, ValueError) as e:
+            return {"ok": False, "state": "unreadable snapshot", "error": str(e)}
+        try:
+            return {
+                "ok": True,
+                "state": "snapshot",
+                "users": len(snapshot),
+                "statuses": snapshot.count_by_status(),
+                "read_ms": round((perf_counter() - start) * 1000, 1)
+            }
+        finally:
+            snapshot.close()
+
+    def _snapshot_is_current(self) -> bool:
+        snapshot = UserSnapshot.open_for(self.snapshot_path, self.path)
+        if snapshot is None:
+            return False
+        snapshot.close()
+        return True
+
+
+class ApiCheck:
+    """Calls getMe on the configured Bot API endpoint, reusing the result for a while."""
+
+    def __init__(self, base_url: str = BOT_API_BASE_URL, interval: float = API_CHECK_INTERVAL):
+        self.base_url = base_url
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._result: Dict = {}
+
+    def check(self) -> Dict:
+        """Get {"ok", ...} for the Bot API, calling it if the last result is too old."""
+        with self._lock:
+            if time() - self._checked_at >= self.interval:
+                self._result = self._call()
+                self._checked_at = time()
+            return self._result
+
+    def _call(self) -> Dict:
+        token = os.getenv("BOT_TOKEN")
+        if not token:
+            return {"ok": False, "error": "BOT_TOKEN is not set"}
+        start = perf_counter()
+        request = urllib.request.Request(f"{self.base_url}{token}/getMe", data=b"", method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=API_CHECK_TIMEOUT) as response:
+                ok = json.load(response).get("ok") is True
+            error = None if ok else "getMe did not return ok"
+        except urllib.error.HTTPError as e:
+            ok, error = False, f"HTTP {e.code}"
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            ok, error = False, str(getattr(e, "reason", e))
+        result = {"ok": ok, "latency_ms": round((perf_counter() - start) * 1000, 1)}
+        if error:
+            result["error"] = error
+        return result
+
+
+def worker_check() -> Dict:
+    """Summarize the worker's last status."""
+    status = read_status()
+    if status is None:
+        return {"up": False, "state": "no status"}
+    age = time() - status.get("updated", 0)
+    up = age < WORKER_STALE_AFTER and not status.get("stopping")
+    return {"up": up, "ready": status.get("ready", False), "pid": status.get("pid"), "age_seconds": round(age, 1)}
+
+
+store_check = StoreCheck()
+api_check = ApiCheck()
+
+
+def readiness() -> Tuple[bool, Dict]:
+    """Check the store and the Bot API. Returns (ready, details)."""
+    store = store_check.check()
+    api = api_check.check()
+    return store["ok"] and api["ok"], {"store": store, "api": api, "worker": worker_check()}
+
+
+def render_metrics() -> str:
+    """The worker's metrics followed by the web process's own gauges."""
+    status = read_status()
+    worker = worker_check()
+    store = store_check.check()
+    metrics.set_gauge("worker_up", 1 if worker["up"] else 0)
+    if "age_seconds" in worker:
+        metrics.set_gauge("worker_status_age_seconds", worker["age_seconds"])
+    metrics.set_gauge("user_store_ok", 1 if store["ok"] else 0)
+    metrics.set_gauge("users_total", store.get("users", 0))
+    metrics.clear_gauges("users")
+    for status_name, count in store.get("statuses", {}).items():
+        metrics.set_gauge("users", count, status=status_name)
+    worker_metrics = status.get("metrics", "") if status else ""
+    return worker_metrics + metrics.render_text()
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    """Serves /healthz, /readyz and /metrics."""
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/healthz":
+            self._send(200, "application/json", json.dumps({"ok": True}))
+        elif path == "/readyz":
+            ready, details = readiness()
+            self._send(200 if ready else 503, "application/json", json.dumps({"ready": ready, **details}))
+        elif path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", render_metrics())
+        else:
+            self._send(404, "application/json", json.dumps({"error": "not found"}))
+
+    def _send(self, code: int, content_type: str, body: str) -> None:
+        data = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # health checks would flood the log
+
+
+def main(port: Optional[int] = None) -> None:
+    """Serve until interrupted."""
+    server = ThreadingHTTPServer(("0.0.0.0", port or PORT), HealthHandler)
+    logger.info(f"Health endpoints on port {server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Worker status module: how the bot worker is doing, shared with web.py.
+
+The worker writes WORKER_STATUS_FILE every WORKER_STATUS_INTERVAL
+seconds, metrics included, and the web process reads it, so health
+checks and metrics scrapes never reach into the worker.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+WORKER_STATUS_FILE = "worker_status.json"
+# Seconds between status writes
+WORKER_STATUS_INTERVAL = float(os.getenv("WORKER_STATUS_INTERVAL", "15"))
+
+
+def write_status(status: Dict, path: str = WORKER_STATUS_FILE) -> None:
+    """Write the worker status atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+
+def read_status(path: str = WORKER_STATUS_FILE) -> Optional[Dict]:
+    """Read the last worker status, or None if there is none."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+async def run_status_writer(collect: Callable[[], Dict], interval: float = WORKER_STATUS_INTERVAL) -> None:
+    """Write collect() (called on the event loop) to the status file every interval."""
+    while True:
+        try:
+            await asyncio.to_thread(write_status, collect())
+        except Exception as e:
+            logger.error(f"Error writing worker status: {e}")
+        await asyncio.sleep(interval)